@@ -0,0 +1,161 @@
+"""
+Per-showtime admission control for bookings.
+
+sp_create_reservation serializes all bookings of a showtime on the showtime
+row lock, so letting hundreds of them in at once only ties up database
+connections. Each showtime gets a gate that admits at most
+ADMISSION_MAX_IN_FLIGHT bookings at a time; the rest wait in a FIFO queue
+and are handed a slot in arrival order as bookings finish. A request that
+cannot get a slot within ADMISSION_MAX_WAIT seconds, or finds the queue
+full, is rejected so the client can back off (429 at the route).
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+
+# Weight of the newest booking duration in the moving average used for ETAs
+_SERVICE_TIME_WEIGHT = 0.2
+
+
+class AdmissionRejected(Exception):
+    """The booking was shed; retry_after is a suggested back-off in seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('user_id', 'enqueued_at', 'granted')
+
+    def __init__(self, user_id: Optional[int]):
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+
+
+class _Gate:
+    """In-flight count and FIFO of waiters for one showtime"""
+
+    __slots__ = ('in_flight', 'waiters', 'service_seconds')
+
+    def __init__(self, service_seconds: float):
+        self.in_flight = 0
+        self.waiters: 'deque[_Waiter]' = deque()
+        self.service_seconds = service_seconds
+
+
+class AdmissionController:
+    """Caps concurrent bookings per showtime with a fair waiting queue"""
+
+    def __init__(self):
+        self._gates: Dict[int, _Gate] = {}
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self.max_in_flight = 2
+        self.max_wait = 10.0
+        self.max_queue = 500
+        self.initial_service_seconds = 0.05
+
+    def init_app(self, app):
+        self.max_in_flight = int(app.config.get('ADMISSION_MAX_IN_FLIGHT', 2))
+        self.max_wait = float(app.config.get('ADMISSION_MAX_WAIT', 10))
+        self.max_queue = int(app.config.get('ADMISSION_MAX_QUEUE', 500))
+
+    @contextmanager
+    def admit(self, showtime_id: int, user_id: Optional[int] = None):
+        """Hold a booking slot for the showtime for the duration of the block"""
+        waiter = None
+        with self._lock:
+            gate = self._gates.get(showtime_id)
+            if gate is None:
+                gate = self._gates[showtime_id] = _Gate(self.initial_service_seconds)
+            if gate.in_flight < self.max_in_flight and not gate.waiters:
+                gate.in_flight += 1
+            elif len(gate.waiters) >= self.max_queue:
+                metrics.incr('admission.rejected_full')
+                raise AdmissionRejected('Booking queue is full', self._eta(gate, len(gate.waiters)))
+            else:
+                waiter = _Waiter(user_id)
+                gate.waiters.append(waiter)
+                self._queue_changed(1)
+
+        if waiter is not None:
+            self._wait(gate, waiter)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(showtime_id, gate, time.monotonic() - started)
+
+    def _wait(self, gate: _Gate, waiter: _Waiter):
+        granted = waiter.granted.wait(self.max_wait)
+        waited = time.monotonic() - waiter.enqueued_at
+        if not granted:
+            with self._lock:
+                # A slot may have been handed over just as the wait timed out
+                granted = waiter.granted.is_set()
+                if not granted:
+                    gate.waiters.remove(waiter)
+                    self._queue_changed(-1)
+                    retry_after = self._eta(gate, len(gate.waiters))
+        metrics.observe('admission.wait', waited)
+        if not granted:
+            metrics.incr('admission.rejected_deadline')
+            raise AdmissionRejected('Timed out waiting for a booking slot', retry_after)
+
+    def _release(self, showtime_id: int, gate: _Gate, service_seconds: float):
+        with self._lock:
+            gate.service_seconds += _SERVICE_TIME_WEIGHT * (service_seconds - gate.service_seconds)
+            if gate.waiters:
+                # Hand the slot straight to the oldest waiter; in_flight is unchanged
+                gate.waiters.popleft().granted.set()
+                self._queue_changed(-1)
+            else:
+                gate.in_flight -= 1
+                if gate.in_flight == 0:
+                    # Idle gates are dropped; the learned booking time seeds the next one
+                    del self._gates[showtime_id]
+                    self.initial_service_seconds = gate.service_seconds
+        metrics.incr('admission.admitted')
+
+    def _queue_changed(self, delta: int):
+        # Called with self._lock held
+        self._waiting += delta
+        metrics.gauge('admission.queue_depth', self._waiting)
+
+    def _eta(self, gate: _Gate, position: int) -> float:
+        """Seconds until the waiter at 1-based position gets a slot, roughly"""
+        return round(position * gate.service_seconds / self.max_in_flight, 3)
+
+    def status(self, showtime_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Queue depth and ETA for a showtime; position of user_id's booking if queued"""
+        with self._lock:
+            gate = self._gates.get(showtime_id)
+            if gate is None:
+                gate = _Gate(self.initial_service_seconds)
+            waiting = len(gate.waiters)
+            result = {
+                'showtime_id': showtime_id,
+                'in_flight': gate.in_flight,
+                'waiting': waiting,
+                'max_in_flight': self.max_in_flight,
+                'avg_booking_seconds': round(gate.service_seconds, 3),
+                # For a booking arriving now
+                'eta_seconds': self._eta(gate, waiting + 1) if gate.in_flight >= self.max_in_flight else 0.0
+            }
+            if user_id is not None:
+                for position, waiter in enumerate(gate.waiters, start=1):
+                    if waiter.user_id == user_id:
+                        result['position'] = position
+                        result['position_eta_seconds'] = self._eta(gate, position)
+                        break
+            return result
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,14 @@
+from flask import Blueprint, jsonify
+from metrics import metrics
+
+metrics_bp = Blueprint('admin_metrics', __name__)
+
+@metrics_bp.route('/', methods=['GET'])
+def get_metrics():
+    """Get in-process counters, gauges and timings"""
+    # TODO: Add admin role check when authentication is implemented
+    
+    return jsonify({
+        'status': 'success',
+        'data': metrics.snapshot()
+    }), 200
@@ -2,6 +2,9 @@ from flask import Blueprint, jsonify, request
 from extensions import db
 from models import Movies, Showtimes, Screens, Cinemas
 from serializers import ModelSerializer
+from catalog_cache import catalog_cache
+from search_index import search_index
+from timetable import timetable
 from sqlalchemy import select, and_, or_, text
 from datetime import datetime, timedelta
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError, OperationalError
@@ -89,6 +92,12 @@ def create_movie():
                     db.session.add(new_showtime)
                     created_showtimes.append(new_showtime)
         
+        # Committed: the public catalog and search must show the new movie
+        catalog_cache.invalidate()
+        search_index.upsert(movie)
+        if created_showtimes:
+            timetable.add_showtimes([showtime.showtime_id for showtime in created_showtimes])
+        
         # If we get here, everything succeeded
         response_data = {
             'status': 'success',
@@ -2,6 +2,9 @@ from flask import Blueprint, jsonify, request
 from extensions import db
 from models import Showtimes, Movies, Screens, Cinemas, Reservations
 from serializers import ModelSerializer
+from capacity import capacity_counters
+from timetable import timetable
+from seat_state import seat_state_engine
 from sqlalchemy import select, and_, text
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from datetime import datetime
@@ -49,6 +52,9 @@ def delete_showtime(showtime_id):
             # Delete the showtime - cascades will handle related data
             db.session.delete(showtime)
             
+        timetable.remove_showtime(showtime_id)
+        seat_state_engine.invalidate(showtime_id)
+        
         # If we get here, deletion was successful
         response_data = {
             'status': 'success',
@@ -127,6 +133,9 @@ def get_showtime_details(showtime_id):
             )
         ).scalar()
         
+        # Live capacity / sold / held from the seat counters
+        seat_counts = capacity_counters.get(showtime_id, db.session.connection())
+        
         return jsonify({
             'status': 'success',
             'data': {
@@ -141,7 +150,8 @@ def get_showtime_details(showtime_id):
                 'cinema_name': result.cinema_name,
                 'start_time': showtime.start_time.isoformat(),
                 'end_time': showtime.end_time.isoformat(),
-                'confirmed_reservations': reservation_count
+                'confirmed_reservations': reservation_count,
+                'seats': seat_counts
             }
         }), 200
         
@@ -150,4 +160,35 @@ def get_showtime_details(showtime_id):
             'status': 'error',
             'message': 'Failed to fetch showtime details',
             'details': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@showtimes_bp.route('/seat-counts/reconcile', methods=['POST'])
+def reconcile_seat_counts():
+    """Check the showtime seat counters against tickets and seat locks
+
+    Query parameters:
+    - repair: rewrite drifted counters (default true)
+    - include_past: also check showtimes that have ended (default false)
+    """
+    # TODO: Add admin role check when authentication is implemented
+    
+    repair = request.args.get('repair', 'true').lower() != 'false'
+    include_past = request.args.get('include_past', 'false').lower() == 'true'
+    
+    try:
+        drifted = capacity_counters.reconcile(repair=repair, include_past=include_past)
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'repaired': repair,
+                'drifted_showtimes': len(drifted),
+                'showtimes': drifted
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to reconcile seat counts',
+            'details': str(e)
+        }), 500
@@ -2,6 +2,9 @@ from flask import Blueprint, jsonify, request
 from models import Movies, Showtimes  # Updated to DDL-first model
 from serializers import ModelSerializer
 from extensions import db
+from catalog_cache import catalog_cache
+from search_index import search_index
+from timetable import timetable
 from datetime import datetime
 
 movie_detail_bp = Blueprint('movie_detail_bp', __name__)
@@ -65,6 +68,10 @@ def update_movie(movie_id):
         movie.status = data['status']
         
     db.session.commit()
+    catalog_cache.invalidate()
+    search_index.upsert(movie)
+    # The status decides whether its showtimes are listed
+    timetable.reload_movie(movie_id)
     return jsonify(ModelSerializer.serialize_movies(movie))
 
 @movie_detail_bp.route('/<int:movie_id>', methods=['DELETE'])
@@ -75,4 +82,7 @@ def delete_movie(movie_id):
         
     db.session.delete(movie)
     db.session.commit()
+    catalog_cache.invalidate()
+    search_index.remove(movie_id)
+    timetable.remove_movie(movie_id)
     return jsonify({'message': 'Movie deleted successfully'}) 
\ No newline at end of file
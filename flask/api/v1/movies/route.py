@@ -2,18 +2,163 @@ from flask import Blueprint, jsonify, request
 from models import Movies, Showtimes, Screens, Cinemas  # Updated to DDL-first models
 from serializers import ModelSerializer
 from extensions import db
+from capacity import capacity_counters
+from catalog_cache import catalog_cache
+from search_index import search_index
+from timetable import timetable
+from pagination import encode_cursor, decode_cursor, parse_limit
 from datetime import datetime
-from sqlalchemy import select, text
+from sqlalchemy import select
 
 movies_bp = Blueprint('movies', __name__)
 
+MAX_BATCH_IDS = 100
+
+def _movie_showtimes(movie_id, movie_title):
+    """Active showtimes of a movie, from the in-memory timetable (no query)"""
+    return [
+        ModelSerializer.serialize_showtime_row(entry, movie_title)
+        for entry in timetable.for_movie(movie_id)
+    ]
+
+def _add_availability(showtimes_list):
+    """Add seats_available, seats_total and selling_fast to each showtime.
+
+    Read from the showtime seat counters for the whole list in one query.
+    """
+    availability = capacity_counters.listing_fields(
+        [showtime['showtime_id'] for showtime in showtimes_list], db.session.connection()
+    )
+    unknown = {'seats_available': None, 'seats_total': None, 'selling_fast': False}
+    for showtime in showtimes_list:
+        showtime.update(availability.get(showtime['showtime_id'], unknown))
+    return showtimes_list
+
 @movies_bp.route('/', methods=['GET'])
 def get_all_movies():
-    """Get all movies"""
-    movies = db.session.execute(select(Movies)).scalars().all()
+    """Get all movies
+    
+    Query parameters:
+    - fields: comma-separated subset of the movie fields (movie_id is always included)
+    - status, genre: exact-match filters
+    - limit, cursor: keyset pagination in movie_id order; without them every
+      matching movie is returned. The next page's cursor is in X-Next-Cursor.
+    """
+    try:
+        params = _parse_movie_list_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Served from the encoded-response cache; only a miss touches the database
+    return catalog_cache.respond(catalog_cache.get(('list',) + params, lambda: _build_movie_list(*params)))
+
+def _parse_movie_list_args(args):
+    """Normalized (fields, status, genre, limit, after) for a movie listing"""
+    fields = ModelSerializer.MOVIE_FIELDS
+    if args.get('fields'):
+        requested = {field.strip() for field in args['fields'].split(',') if field.strip()}
+        unknown = requested.difference(ModelSerializer.MOVIE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        requested.add('movie_id')
+        fields = tuple(field for field in ModelSerializer.MOVIE_FIELDS if field in requested)
+    
+    status = args.get('status')
+    if status is not None and status not in ('open', 'closed'):
+        raise ValueError("status must be 'open' or 'closed'")
+    genre = args.get('genre')
+    
+    paginate = 'limit' in args or 'cursor' in args
+    limit = parse_limit(args.get('limit')) if paginate else None
+    after = decode_cursor(args['cursor'], (int,))[0] if args.get('cursor') else None
+    return fields, status, genre, limit, after
+
+def _build_movie_list(fields, status, genre, limit, after):
+    # Only the requested columns are read, as plain rows (no ORM entities);
+    # the filters use idx_movies_status_release and idx_movies_genre
+    query = select(*(getattr(Movies, field) for field in fields)).order_by(Movies.movie_id)
+    if status is not None:
+        query = query.where(Movies.status == status)
+    if genre is not None:
+        query = query.where(Movies.genre == genre)
+    if after is not None:
+        query = query.where(Movies.movie_id > after)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = db.session.execute(query).all()
+    
+    has_more = limit is not None and len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+    
+    response = jsonify({
+        'status': 'success',
+        'data': [ModelSerializer.serialize_movie_row(row, fields) for row in rows]
+    })
+    if has_more:
+        response.headers['X-Next-Cursor'] = encode_cursor((rows[-1].movie_id,))
+    return response
+
+@movies_bp.route('/search', methods=['GET'])
+def search_movies():
+    """Search movies by title, director, cast and genre (prefix matching, best first)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'), default=10, maximum=50)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     return jsonify({
         'status': 'success',
-        'data': ModelSerializer.serialize_movies_list(movies)
+        'data': search_index.search(query, limit)
+    }), 200
+
+@movies_bp.route('/batch', methods=['GET'])
+def get_movies_batch():
+    """Get several movies at once, optionally with their showtimes
+    
+    Query parameters:
+    - ids: comma-separated movie ids (at most MAX_BATCH_IDS)
+    - include=showtimes: add each movie's active showtimes with availability
+    
+    Movies come from one IN query; showtimes come from the timetable and
+    their availability from one grouped query over all of them.
+    """
+    try:
+        movie_ids = list(dict.fromkeys(int(value) for value in request.args.get('ids', '').split(',') if value.strip()))
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+    if not movie_ids:
+        return jsonify({'error': 'Query parameter ids is required'}), 400
+    if len(movie_ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+    include = {value.strip() for value in request.args.get('include', '').split(',')}
+    
+    movies = {
+        movie.movie_id: movie
+        for movie in db.session.execute(select(Movies).where(Movies.movie_id.in_(movie_ids))).scalars()
+    }
+    
+    result = []
+    all_showtimes = []
+    for movie_id in movie_ids:
+        movie = movies.get(movie_id)
+        if movie is None:
+            continue
+        movie_dict = ModelSerializer.serialize_movies(movie)
+        if 'showtimes' in include:
+            movie_dict['showtimes'] = _movie_showtimes(movie_id, movie.title)
+            all_showtimes.extend(movie_dict['showtimes'])
+        result.append(movie_dict)
+    if all_showtimes:
+        _add_availability(all_showtimes)
+    
+    return jsonify({
+        'status': 'success',
+        'data': result,
+        'missing': [movie_id for movie_id in movie_ids if movie_id not in movies]
     }), 200
 
 @movies_bp.route('/<int:movie_id>', methods=['GET'])
@@ -25,52 +170,9 @@ def get_movie(movie_id):
         
     movie_dict = ModelSerializer.serialize_movies(movie)
     
-    # Get active showtimes for this movie using the view
-    showtimes_query = text("""
-        SELECT 
-            showtime_id,
-            movie_id,
-            screen_id,
-            start_time,
-            end_time,
-            screen_name,
-            screen_format,
-            cinema_id,
-            cinema_name,
-            cinema_address,
-            cinema_city
-        FROM v_active_showtimes_details
-        WHERE movie_id = :movie_id
-        ORDER BY start_time
-    """)
-    
-    showtimes_result = db.session.execute(showtimes_query, {'movie_id': movie_id})
-    showtimes_list = []
-    
-    for row in showtimes_result:
-        showtime_dict = {
-            'showtime_id': row.showtime_id,
-            'movie_id': row.movie_id,
-            'screen_id': row.screen_id,
-            'start_time': row.start_time.isoformat(),
-            'end_time': row.end_time.isoformat(),
-            'movie_title': movie.title,
-            'screen': {
-                'screen_id': row.screen_id,
-                'cinema_id': row.cinema_id,
-                'name': row.screen_name,
-                'screen_format': row.screen_format
-            },
-            'cinema': {
-                'cinema_id': row.cinema_id,
-                'name': row.cinema_name,
-                'address': row.cinema_address,
-                'city': row.cinema_city
-            }
-        }
-        showtimes_list.append(showtime_dict)
-    
-    movie_dict['showtimes'] = showtimes_list
+    showtimes_list = _movie_showtimes(movie_id, movie.title)
+    
+    movie_dict['showtimes'] = _add_availability(showtimes_list)
     
     return jsonify({
         'status': 'success',
@@ -85,54 +187,11 @@ def get_movie_showtimes(movie_id):
     if not movie:
         return jsonify({'error': 'Movie not found'}), 404
     
-    # Get active showtimes for this movie using the view
-    showtimes_query = text("""
-        SELECT 
-            showtime_id,
-            movie_id,
-            screen_id,
-            start_time,
-            end_time,
-            screen_name,
-            screen_format,
-            cinema_id,
-            cinema_name,
-            cinema_address,
-            cinema_city
-        FROM v_active_showtimes_details
-        WHERE movie_id = :movie_id
-        ORDER BY start_time
-    """)
-    
-    showtimes_result = db.session.execute(showtimes_query, {'movie_id': movie_id})
-    showtimes_list = []
-    
-    for row in showtimes_result:
-        showtime_dict = {
-            'showtime_id': row.showtime_id,
-            'movie_id': row.movie_id,
-            'screen_id': row.screen_id,
-            'start_time': row.start_time.isoformat(),
-            'end_time': row.end_time.isoformat(),
-            'movie_title': movie.title,
-            'screen': {
-                'screen_id': row.screen_id,
-                'cinema_id': row.cinema_id,
-                'name': row.screen_name,
-                'screen_format': row.screen_format
-            },
-            'cinema': {
-                'cinema_id': row.cinema_id,
-                'name': row.cinema_name,
-                'address': row.cinema_address,
-                'city': row.cinema_city
-            }
-        }
-        showtimes_list.append(showtime_dict)
+    showtimes_list = _movie_showtimes(movie_id, movie.title)
     
     return jsonify({
         'status': 'success',
-        'data': showtimes_list
+        'data': _add_availability(showtimes_list)
     }), 200
 
 @movies_bp.route('/', methods=['POST'])
@@ -168,5 +227,7 @@ def create_movie():
     
     db.session.add(movie)
     db.session.commit()
+    catalog_cache.invalidate()
+    search_index.upsert(movie)
     
     return jsonify(ModelSerializer.serialize_movies(movie)), 201
@@ -2,9 +2,15 @@ from flask import Blueprint, request, jsonify
 from models import Reservations, Tickets, SeatLocks, Seats, Showtimes  # Updated to DDL-first models
 from serializers import ModelSerializer
 from extensions import db
+from seat_state import seat_state_engine
+from pagination import encode_cursor, decode_cursor, parse_limit
+from idempotency import idempotent
+from admission import admission_controller, AdmissionRejected
+from booking import booking_pipeline, call_create_reservation
 from datetime import datetime, timedelta
-from sqlalchemy import select, text
+from sqlalchemy import select, text, and_, or_
 from sqlalchemy.orm import selectinload
+import math
 
 reservations_bp = Blueprint('reservations', __name__)
 
@@ -15,29 +21,56 @@ def get_reservations():
     if not user_id:
         return jsonify({'error': 'User ID is required'}), 400
     
-    reservations = db.session.execute(
-        select(Reservations).where(Reservations.user_id == user_id)
-    ).scalars().all()
-    result = []
+    try:
+        # Without limit/cursor the whole history is returned, as before paging
+        paginate = 'limit' in request.args or 'cursor' in request.args
+        limit = parse_limit(request.args.get('limit')) if paginate else None
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor, (datetime, int)) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
+    # Newest first, keyed on (created_at, reservation_id) so pages are stable;
+    # idx_reservations_user_created answers the range scan
+    query = (
+        select(Reservations)
+        .where(Reservations.user_id == user_id)
+        .options(
+            selectinload(Reservations.tickets).selectinload(Tickets.seat),
+            selectinload(Reservations.showtime).selectinload(Showtimes.movie)
+        )
+        .order_by(Reservations.created_at.desc(), Reservations.reservation_id.desc())
+    )
+    if limit is not None:
+        query = query.limit(limit + 1)
+    if after is not None:
+        created_at, reservation_id = after
+        query = query.where(or_(
+            Reservations.created_at < created_at,
+            and_(Reservations.created_at == created_at, Reservations.reservation_id < reservation_id)
+        ))
+    reservations = db.session.execute(query).scalars().all()
+    
+    has_more = limit is not None and len(reservations) > limit
+    if has_more:
+        reservations = reservations[:limit]
+    result = []
     for reservation in reservations:
         res_dict = ModelSerializer.serialize_reservations(reservation)
-        # Get tickets for this reservation with seat relationship loaded
-        tickets = db.session.execute(
-            select(Tickets)
-            .options(selectinload(Tickets.seat))
-            .where(Tickets.reservation_id == reservation.reservation_id)
-        ).scalars().all()
-        res_dict['tickets'] = ModelSerializer.serialize_tickets_list(tickets)
-        # Get showtime details
-        showtime = db.session.get(Showtimes, reservation.showtime_id)
-        if showtime:
-            res_dict['showtime'] = ModelSerializer.serialize_showtimes(showtime)
+        res_dict['tickets'] = ModelSerializer.serialize_tickets_list(reservation.tickets)
+        if reservation.showtime:
+            res_dict['showtime'] = ModelSerializer.serialize_showtimes(reservation.showtime)
         result.append(res_dict)
     
-    return jsonify(result)
+    # The body stays a plain list; the next page is advertised in a header
+    response = jsonify(result)
+    if has_more:
+        last = reservations[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor((last.created_at, last.reservation_id))
+    return response
 
 @reservations_bp.route('/', methods=['POST'])
+@idempotent
 def create_reservation():
     data = request.json
     
@@ -51,61 +84,65 @@ def create_reservation():
     showtime_id = data['showtime_id']
     seat_ids = data['seats']
     
-    # Verify showtime exists
-    showtime = db.session.get(Showtimes, showtime_id)
-    if not showtime:
-        return jsonify({'error': 'Showtime not found'}), 404
-    
     try:
-        # Use the stored procedure to create the reservation
-        # This will handle validation, create reservation, tickets, and set status to confirmed
-        import json
-        seat_ids_json = json.dumps(seat_ids)
+        if booking_pipeline.mode != 'procedure':
+            # Group commit or optimistic path, see booking.py
+            reservation, tickets = booking_pipeline.book(user_id, showtime_id, seat_ids)
+        else:
+            # Use the stored procedure (it also reports a missing showtime) to create the reservation.
+            # This will handle validation, create reservation, tickets, and set status to confirmed.
+            # Bookings for one showtime serialize on its row lock inside the
+            # procedure, so only a few are let through at a time.
+            with admission_controller.admit(showtime_id, user_id):
+                reservation, tickets = call_create_reservation(
+                    db.session.connection(), user_id, showtime_id, seat_ids
+                )
+                db.session.commit()
+        seat_state_engine.apply_sold(showtime_id, seat_ids)
         
-        # Call the stored procedure
-        db.session.execute(
-            text("CALL sp_create_reservation(:user_id, :showtime_id, :seat_ids)"),
+        # Prepare response in the serializers' shape
+        result = {
+            'reservation_id': reservation['reservation_id'],
+            'user_id': reservation['user_id'],
+            'showtime_id': reservation['showtime_id'],
+            'status': reservation['status'],
+            'created_at': reservation['created_at'].isoformat(),
+            'expires_at': reservation['expires_at'].isoformat()
+        }
+        result['tickets'] = [
             {
-                'user_id': user_id,
-                'showtime_id': showtime_id,
-                'seat_ids': seat_ids_json
+                'ticket_id': ticket['ticket_id'],
+                'reservation_id': ticket['reservation_id'],
+                'seat_id': ticket['seat_id'],
+                'seat_label': ticket['seat_label'],
+                'price': float(ticket['price']),
+                'issued_at': ticket['issued_at'].isoformat()
             }
-        )
-        db.session.commit()
-        
-        # Get the created reservation (it will be the most recent one for this user/showtime)
-        reservation = db.session.execute(
-            select(Reservations).where(
-                Reservations.user_id == user_id,
-                Reservations.showtime_id == showtime_id
-            ).order_by(Reservations.created_at.desc())
-        ).scalars().first()
-        
-        if not reservation:
-            return jsonify({'error': 'Failed to retrieve created reservation'}), 500
-        
-        # Get tickets for this reservation with seat relationship loaded
-        tickets = db.session.execute(
-            select(Tickets)
-            .options(selectinload(Tickets.seat))
-            .where(Tickets.reservation_id == reservation.reservation_id)
-        ).scalars().all()
-        
-        # Prepare response
-        result = ModelSerializer.serialize_reservations(reservation)
-        result['tickets'] = ModelSerializer.serialize_tickets_list(tickets)
+            for ticket in tickets
+        ]
         
         return jsonify(result), 201
         
+    except AdmissionRejected as e:
+        db.session.rollback()
+        response = jsonify({'error': f'{e}, please retry', 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+        return response, 429
     except Exception as e:
         db.session.rollback()
         error_msg = str(e)
-        if 'One or more seats already sold' in error_msg:
+        if 'Showtime not found' in error_msg:
+            return jsonify({'error': 'Showtime not found'}), 404
+        elif 'One or more seats do not belong to the showtime screen' in error_msg:
+            return jsonify({'error': 'One or more seats do not belong to the showtime screen'}), 400
+        elif 'One or more seats already sold' in error_msg or 'sold_seats.PRIMARY' in error_msg:
             return jsonify({'error': 'One or more seats are already sold'}), 400
         elif 'Seat currently locked by another user' in error_msg:
             return jsonify({'error': 'One or more seats are locked by another user'}), 400
         elif 'Seat is not locked by this user' in error_msg:
             return jsonify({'error': 'Seats must be locked before creating reservation'}), 400
+        elif 'No ticket price' in error_msg:
+            return jsonify({'error': 'One or more seats have no ticket price'}), 400
         else:
             return jsonify({'error': f'Failed to create reservation: {error_msg}'}), 500
 
@@ -139,12 +176,18 @@ def cancel_reservation(reservation_id):
         return jsonify({'error': 'Reservation is already cancelled'}), 400
     
     try:
+        # Remember which seats the procedure is about to free
+        seat_ids = db.session.execute(
+            select(Tickets.seat_id).where(Tickets.reservation_id == reservation_id)
+        ).scalars().all()
+        
         # Use stored procedure for proper cleanup
         db.session.execute(
             text("CALL sp_cancel_reservation(:reservation_id)"),
             {'reservation_id': reservation_id}
         )
         db.session.commit()
+        seat_state_engine.apply_cancel(reservation.showtime_id, seat_ids, reservation.user_id)
         
         # Refresh the reservation object to get updated status
         db.session.refresh(reservation)
@@ -1,67 +1,42 @@
-from flask import Blueprint, request, jsonify
-from models import Seats, SeatLocks, Showtimes, Tickets, Reservations
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from models import Seats, Showtimes, Tickets, Reservations
 from extensions import db
-from datetime import datetime, timedelta
-from sqlalchemy import select, text
+from seat_status import stream_seat_statuses, iter_seats_json
+from seat_state import seat_state_engine
+from seat_locks import seat_lock_store
+from expiry import expiry_reaper
+from sqlalchemy import select
+import itertools
 
 seats_bp = Blueprint('seats', __name__)
 
 @seats_bp.route('/<int:showtime_id>/seats', methods=['GET'])
 def get_seats(showtime_id):
-    # First check if the showtime exists
-    showtime = db.session.get(Showtimes, showtime_id)
-    if not showtime:
-        return jsonify({'error': 'Showtime not found'}), 404
-    
-    # Get all seats for the screen
-    seats = db.session.execute(
-        select(Seats).where(Seats.screen_id == showtime.screen_id)
-    ).scalars().all()
-    
-    # Get available seats using the view for efficiency
-    available_seats_query = text("""
-        SELECT seat_id 
-        FROM v_available_seats 
-        WHERE showtime_id = :showtime_id
-    """)
-    available_result = db.session.execute(
-        available_seats_query, 
-        {'showtime_id': showtime_id}
-    )
-    available_seat_ids = {row.seat_id for row in available_result}
-    
-    # Get all locked seats for this showtime
-    current_time = datetime.utcnow()
-    locks = db.session.execute(
-        select(SeatLocks).where(
-            SeatLocks.showtime_id == showtime_id,
-            SeatLocks.expires_at > current_time
-        )
-    ).scalars().all()
-    locked_seat_ids = {lock.seat_id for lock in locks}
-    
-    # Build result with status determination
-    result = []
-    for seat in seats:
-        if seat.seat_id in available_seat_ids:
-            status = 'available'
-        elif seat.seat_id in locked_seat_ids:
-            status = 'locked'
-        else:
-            status = 'sold'
-            
-        seat_dict = {
-            'seat_id': seat.seat_id,
-            'screen_id': seat.screen_id,
-            'seat_class': seat.seat_class,
-            'seat_label': seat.seat_label,
-            'row_num': seat.row_num,
-            'col_num': seat.col_num,
-            'status': status
-        }
-        result.append(seat_dict)
-    
-    return jsonify(result)
+    # Layout and computed status in one query, streamed straight to the client
+    conn = db.engine.connect()
+    streaming = False
+    try:
+        rows = stream_seat_statuses(conn, showtime_id)
+        first = next(rows, None)
+        if first is None:
+            if not db.session.get(Showtimes, showtime_id):
+                return jsonify({'error': 'Showtime not found'}), 404
+            return jsonify([])
+        
+        def generate():
+            try:
+                yield from iter_seats_json(itertools.chain([first], rows))
+            finally:
+                conn.close()
+        
+        response = Response(stream_with_context(generate()), mimetype='application/json')
+        # Also closed with the response, in case the body is never iterated
+        response.call_on_close(conn.close)
+        streaming = True
+        return response
+    finally:
+        if not streaming:
+            conn.close()
 
 @seats_bp.route('/<int:showtime_id>/seats/<int:seat_id>/lock', methods=['POST'])
 def lock_seat(showtime_id, seat_id):
@@ -90,60 +65,28 @@ def lock_seat(showtime_id, seat_id):
     if sold:
         return jsonify({'error': 'Seat already sold'}), 400
     
-    # Check if the seat is already locked by someone else
-    current_time = datetime.utcnow()
-    lock = db.session.execute(
-        select(SeatLocks).where(
-            SeatLocks.showtime_id == showtime_id,
-            SeatLocks.seat_id == seat_id,
-            SeatLocks.expires_at > current_time
-        )
-    ).scalar_one_or_none()
-    
     data = request.json
     user_id = data.get('user_id')
     
-    if lock and lock.user_id != user_id:
+    # Take the lock, or extend the user's own lock, in one atomic step
+    result = seat_lock_store.acquire(showtime_id, [seat_id], user_id)
+    if not result.success:
         return jsonify({'error': 'Seat is locked by another user'}), 400
     
-    # Create or update the lock
-    expiry_time = current_time + timedelta(minutes=15)
-    
-    if lock:
-        lock.expires_at = expiry_time
-    else:
-        lock = SeatLocks(
-            showtime_id=showtime_id,
-            seat_id=seat_id,
-            user_id=user_id,
-            locked_at=current_time,
-            expires_at=expiry_time
-        )
-        db.session.add(lock)
+    seat_state_engine.apply_lock(showtime_id, [seat_id], user_id, result.expires_at)
+    expiry_reaper.schedule(result.expires_at)
     
-    db.session.commit()
-    
-    return jsonify({'message': 'Seat locked successfully', 'expires_at': expiry_time.isoformat()})
+    return jsonify({'message': 'Seat locked successfully', 'expires_at': result.expires_at.isoformat()})
 
 @seats_bp.route('/<int:showtime_id>/seats/<int:seat_id>/unlock', methods=['POST'])
 def unlock_seat(showtime_id, seat_id):
     data = request.json
     user_id = data.get('user_id')
     
-    # Check if the lock exists and belongs to the user
-    lock = db.session.execute(
-        select(SeatLocks).where(
-            SeatLocks.showtime_id == showtime_id,
-            SeatLocks.seat_id == seat_id,
-            SeatLocks.user_id == user_id
-        )
-    ).scalar_one_or_none()
-    
-    if not lock:
+    result = seat_lock_store.release(showtime_id, [seat_id], user_id)
+    if not result.success:
         return jsonify({'error': 'No active lock found for this user'}), 404
     
-    # Delete the lock
-    db.session.delete(lock)
-    db.session.commit()
+    seat_state_engine.apply_unlock(showtime_id, [seat_id])
     
     return jsonify({'message': 'Seat unlocked successfully'})
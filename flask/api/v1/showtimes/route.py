@@ -0,0 +1,133 @@
+from flask import Blueprint, jsonify, request
+from models import Showtimes, Movies, Screens, Cinemas  # DDL-first models
+from extensions import db
+from pagination import encode_cursor, decode_cursor, parse_limit
+from datetime import datetime, timedelta
+from sqlalchemy import select, and_, or_
+
+showtimes_bp = Blueprint('showtimes', __name__)
+
+SCREEN_FORMATS = ('2D', '3D', 'IMAX')
+
+def _parse_int(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+def _parse_datetime(args, name):
+    """YYYY-MM-DD or ISO datetime; a bare date_to covers the whole day"""
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD) or ISO datetime')
+    if name == 'date_to' and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+@showtimes_bp.route('/', methods=['GET'])
+def search_showtimes():
+    """Search upcoming showtimes of open movies
+
+    Query parameters (all optional):
+    - city, cinema_id, movie_id, format: exact-match filters
+    - date_from, date_to: start_time range; date_from defaults to now
+      (local time, the clock showtime times are stored in)
+    - limit, cursor: keyset pagination in (start_time, showtime_id) order;
+      the next page's cursor is in X-Next-Cursor
+    """
+    args = request.args
+    try:
+        cinema_id = _parse_int(args, 'cinema_id')
+        movie_id = _parse_int(args, 'movie_id')
+        date_from = _parse_datetime(args, 'date_from') or datetime.now()
+        date_to = _parse_datetime(args, 'date_to')
+        screen_format = args.get('format')
+        if screen_format is not None and screen_format not in SCREEN_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(SCREEN_FORMATS)}")
+        limit = parse_limit(args.get('limit'))
+        cursor = args.get('cursor')
+        after = decode_cursor(cursor, (datetime, int)) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # One projection query; the start_time range (with movie_id when given)
+    # is answered by idx_showtimes_start_time / idx_showtimes_movie_start,
+    # whose order already is (start_time, showtime_id), so LIMIT stops early
+    query = (
+        select(
+            Showtimes.showtime_id,
+            Showtimes.start_time,
+            Showtimes.end_time,
+            Movies.movie_id,
+            Movies.title.label('movie_title'),
+            Movies.rating.label('movie_rating'),
+            Movies.poster_url.label('movie_poster_url'),
+            Screens.screen_id,
+            Screens.name.label('screen_name'),
+            Screens.screen_format,
+            Cinemas.cinema_id,
+            Cinemas.name.label('cinema_name'),
+            Cinemas.city.label('cinema_city')
+        )
+        .join(Movies, Movies.movie_id == Showtimes.movie_id)
+        .join(Screens, Screens.screen_id == Showtimes.screen_id)
+        .join(Cinemas, Cinemas.cinema_id == Screens.cinema_id)
+        .where(Showtimes.start_time >= date_from, Movies.status == 'open')
+        .order_by(Showtimes.start_time, Showtimes.showtime_id)
+        .limit(limit + 1)
+    )
+    if date_to is not None:
+        query = query.where(Showtimes.start_time < date_to)
+    if movie_id is not None:
+        query = query.where(Showtimes.movie_id == movie_id)
+    if cinema_id is not None:
+        query = query.where(Screens.cinema_id == cinema_id)
+    if args.get('city'):
+        query = query.where(Cinemas.city == args['city'])
+    if screen_format is not None:
+        query = query.where(Screens.screen_format == screen_format)
+    if after is not None:
+        query = query.where(or_(
+            Showtimes.start_time > after[0],
+            and_(Showtimes.start_time == after[0], Showtimes.showtime_id > after[1])
+        ))
+
+    rows = db.session.execute(query).all()
+    has_more = len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+
+    result = [
+        {
+            'showtime_id': row.showtime_id,
+            'start_time': row.start_time.isoformat(),
+            'end_time': row.end_time.isoformat(),
+            'movie_id': row.movie_id,
+            'movie_title': row.movie_title,
+            'movie_rating': row.movie_rating,
+            'movie_poster_url': row.movie_poster_url,
+            'screen_id': row.screen_id,
+            'screen_name': row.screen_name,
+            'screen_format': row.screen_format,
+            'cinema_id': row.cinema_id,
+            'cinema_name': row.cinema_name,
+            'cinema_city': row.cinema_city
+        }
+        for row in rows
+    ]
+
+    response = jsonify({
+        'status': 'success',
+        'data': result
+    })
+    if has_more:
+        last = rows[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor((last.start_time, last.showtime_id))
+    return response
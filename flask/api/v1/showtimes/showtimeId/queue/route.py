@@ -0,0 +1,18 @@
+from flask import Blueprint, request, jsonify
+from models import Showtimes
+from extensions import db
+from admission import admission_controller
+
+queue_bp = Blueprint('booking_queue', __name__)
+
+@queue_bp.route('/<int:showtime_id>/queue', methods=['GET'])
+def get_booking_queue(showtime_id):
+    """Booking queue depth and ETA; with ?user_id= also that user's position"""
+    if not db.session.get(Showtimes, showtime_id):
+        return jsonify({'error': 'Showtime not found'}), 404
+    
+    user_id = request.args.get('user_id', type=int)
+    return jsonify({
+        "data": admission_controller.status(showtime_id, user_id),
+        "success": True
+    })
@@ -0,0 +1,33 @@
+from flask import Blueprint, request, jsonify
+from seat_state import seat_state_engine
+from pricing import pricing_engine, PricingError
+
+quote_bp = Blueprint('quote', __name__)
+
+@quote_bp.route('/<int:showtime_id>/quote', methods=['POST'])
+def quote_seats(showtime_id):
+    """Price a list of seats for a showtime before booking"""
+    data = request.get_json(silent=True) or {}
+    seat_ids = data.get('seat_ids')
+    if not isinstance(seat_ids, list) or not seat_ids or \
+            not all(isinstance(seat_id, int) and not isinstance(seat_id, bool) for seat_id in seat_ids):
+        return jsonify({'error': 'seat_ids must be a non-empty list of seat ids', 'success': False}), 400
+    seat_ids = list(dict.fromkeys(seat_ids))
+    
+    # Layout and prices are both served from memory
+    state = seat_state_engine.get(showtime_id)
+    if state is None:
+        return jsonify({'error': 'Showtime not found'}), 404
+    
+    unknown = [seat_id for seat_id in seat_ids if seat_id not in state.layout.index]
+    if unknown:
+        return jsonify({'error': 'Seats do not belong to the showtime screen',
+                        'seat_ids': unknown, 'success': False}), 400
+    
+    try:
+        quote = pricing_engine.quote(state.layout, seat_ids)
+    except PricingError as e:
+        return jsonify({'error': str(e), 'success': False}), 500
+    
+    quote['showtime_id'] = showtime_id
+    return jsonify({"data": quote, "success": True})
@@ -1,10 +1,18 @@
-from flask import Blueprint, request, jsonify
-from models import Seats, SeatLocks, Showtimes, Tickets, Reservations  # Updated to DDL-first models
-from serializers import ModelSerializer
+from flask import Blueprint, Response, request, jsonify, make_response, stream_with_context
+from models import Seats, Showtimes, Tickets, Reservations  # Updated to DDL-first models
 from extensions import db
-from datetime import datetime, timedelta
+from seat_state import seat_state_engine
+from seat_events import seat_event_hub, format_sse
+from expiry import expiry_reaper
+from layout_cache import SEAT_CLASSES
+from seat_finder import find_best_block
+from seat_locks import seat_lock_store
+from idempotency import idempotent
+import seatmap_codec
+from datetime import datetime
 from sqlalchemy import select
 import logging
+import queue
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -16,60 +24,172 @@ seats_bp = Blueprint('seats', __name__)
 def get_seats(showtime_id):
     logger.info(f"GET request received for showtime_id: {showtime_id}")
     try:
-        # First check if the showtime exists
-        showtime = db.session.get(Showtimes, showtime_id)
-        if not showtime:
+        # Seat statuses come from the in-memory engine; the database is only
+        # read the first time a showtime is requested (or after it goes stale)
+        state = seat_state_engine.get(showtime_id)
+        if state is None:
             return jsonify({'error': 'Showtime not found'}), 404
-        logger.debug(f"Showtime found: {showtime}")
         
-        # Get all seats for the screen
-        seats = db.session.execute(
-            select(Seats).where(Seats.screen_id == showtime.screen_id)
-        ).scalars().all()
-        logger.debug(f"Found {len(seats)} seats for this showtime")
+        # Compact variant: layout hash plus two status bits per seat
+        binary = request.accept_mimetypes.best_match(['application/json', seatmap_codec.MEDIA_TYPE]) \
+            == seatmap_codec.MEDIA_TYPE
+        # One read gives both the body and its version, so the ETag always matches the body
+        if binary:
+            version, status_codes = state.status_codes()
+        else:
+            version, statuses = state.snapshot()
         
-        # Get all locked seats for this showtime
-        current_time = datetime.utcnow()
-        locks = db.session.execute(
-            select(SeatLocks).where(
-                SeatLocks.showtime_id == showtime_id,
-                SeatLocks.expires_at > current_time
-            )
-        ).scalars().all()
-        locked_seat_ids = {lock.seat_id for lock in locks}
-        logger.debug(f"Found {len(locked_seat_ids)} locked seats")
+        # Nothing changed since the client's copy: skip building the body
+        etag = seat_state_engine.etag(showtime_id, version) + ('-bin' if binary else '')
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            return response
         
-        # Get all sold seats (tickets) for this showtime
-        sold_seats = db.session.execute(
-            select(Tickets).join(Reservations).where(
-                Reservations.showtime_id == showtime_id,
-                Reservations.status == 'confirmed'
-            )
-        ).scalars().all()
-        sold_seat_ids = {ticket.seat_id for ticket in sold_seats}
-        logger.debug(f"Found {len(sold_seat_ids)} sold seats")
+        if binary:
+            layout_hash = state.layout.fingerprint()
+            response = make_response(seatmap_codec.encode(showtime_id, version, layout_hash, status_codes))
+            response.mimetype = seatmap_codec.MEDIA_TYPE
+            response.headers['X-Layout-Hash'] = layout_hash
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            return response
         
-        result = []
-        for seat in seats:
-            seat_dict = ModelSerializer.serialize_seats(seat)
-            seat_dict.update({
-                'status': 'sold' if seat.seat_id in sold_seat_ids else 
-                          'locked' if seat.seat_id in locked_seat_ids else 'available'
-            })
-            result.append(seat_dict)
+        result = state.to_list(statuses)
+        logger.debug(f"Serving {len(result)} seats for showtime {showtime_id}")
         
         # Return in the format expected by the frontend
         response_data = {
             "data": result,
+            "version": version,
             "success": True
         }
         logger.info("Successfully retrieved seats data")
-        return jsonify(response_data)
+        response = jsonify(response_data)
+        response.set_etag(etag)
+        response.vary.add('Accept')
+        return response
     except Exception as e:
         logger.error(f"Error retrieving seats: {str(e)}")
         return jsonify({"error": str(e), "success": False}), 500
 
+@seats_bp.route('/<int:showtime_id>/seats/layout', methods=['GET'])
+def get_seat_layout(showtime_id):
+    """Get the static seat layout referenced by the compact seat-map format"""
+    state = seat_state_engine.get(showtime_id)
+    if state is None:
+        return jsonify({'error': 'Showtime not found'}), 404
+    
+    layout_hash = state.layout.fingerprint()
+    if request.if_none_match.contains(layout_hash):
+        response = make_response('', 304)
+        response.set_etag(layout_hash)
+        return response
+    
+    response = jsonify({
+        "data": state.layout.records(),
+        "layout_hash": layout_hash,
+        "success": True
+    })
+    response.set_etag(layout_hash)
+    return response
+
+@seats_bp.route('/<int:showtime_id>/seats/changes', methods=['GET'])
+def get_seat_changes(showtime_id):
+    """Get the seats whose status changed since a seat-map version"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'Query parameter since is required', 'success': False}), 400
+    
+    try:
+        state = seat_state_engine.get(showtime_id)
+        if state is None:
+            return jsonify({'error': 'Showtime not found'}), 404
+        version, reset, changes = state.changes_since(since)
+        
+        # When reset is true the client's version is too old (or unknown to
+        # this process) and changes holds the status of every seat
+        return jsonify({
+            "data": changes,
+            "version": version,
+            "reset": reset,
+            "success": True
+        })
+    except Exception as e:
+        logger.error(f"Error retrieving seat changes: {str(e)}")
+        return jsonify({"error": str(e), "success": False}), 500
+
+@seats_bp.route('/<int:showtime_id>/seats/stream', methods=['GET'])
+def stream_seat_changes(showtime_id):
+    """Stream seat status changes as server-sent events.
+    
+    Each event id is the seat-map version, so a reconnecting client resumes
+    from its Last-Event-ID. When the version is unknown or too old the stream
+    starts with a full snapshot event instead. If the showtime is deleted the
+    stream ends with a 'closed' event.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('since'))
+    try:
+        since = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        since = None
+    
+    state = seat_state_engine.get(showtime_id)
+    if state is None:
+        return jsonify({'error': 'Showtime not found'}), 404
+    
+    def events():
+        # Subscribe before reading the backlog so no change falls in between
+        subscription = seat_event_hub.subscribe(showtime_id)
+        try:
+            current = seat_state_engine.get(showtime_id)
+            if current is None:
+                # Deleted since the request was accepted
+                yield format_sse({'type': 'closed', 'reason': 'Showtime not found'}, event='closed')
+                return
+            if since is None:
+                version, reset, changes = current.changes_since(-1)
+            else:
+                version, reset, changes = current.changes_since(since)
+            if reset:
+                yield format_sse({'type': 'snapshot', 'seats': changes}, version)
+            else:
+                for change in changes:
+                    yield format_sse({'type': change['event'], 'seat_id': change['seat_id'],
+                                      'status': change['status']}, version)
+            
+            while not subscription.overflowed:
+                # Wake up for the next lock expiry so expired events go out on time
+                current = seat_state_engine.get(showtime_id)
+                if current is None:
+                    yield format_sse({'type': 'closed', 'reason': 'Showtime not found'}, event='closed')
+                    return
+                next_expiry = current.expire_due()
+                timeout = min(seat_event_hub.heartbeat_seconds,
+                              max(0.0, next_expiry - datetime.utcnow().timestamp()))
+                try:
+                    event_version, seat_id, status, event = subscription.events.get(timeout=timeout)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event_version <= version:
+                    continue
+                version = event_version
+                yield format_sse({'type': event, 'seat_id': seat_id, 'status': status}, version)
+            
+            # Too slow to keep up: ask the client to reconnect for a fresh snapshot
+            yield format_sse({'type': 'overflow'}, event='reset')
+        finally:
+            seat_event_hub.unsubscribe(subscription)
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @seats_bp.route('/<int:showtime_id>/seats/<int:seat_id>/lock', methods=['POST'])
+@idempotent
 def lock_seat(showtime_id, seat_id):
     # Check if showtime and seat exist
     showtime = db.session.get(Showtimes, showtime_id)
@@ -96,60 +216,199 @@ def lock_seat(showtime_id, seat_id):
     if sold:
         return jsonify({'error': 'Seat already sold'}), 400
     
-    # Check if the seat is already locked by someone else
-    current_time = datetime.utcnow()
-    lock = db.session.execute(
-        select(SeatLocks).where(
-            SeatLocks.showtime_id == showtime_id,
-            SeatLocks.seat_id == seat_id,
-            SeatLocks.expires_at > current_time
-        )
-    ).scalar_one_or_none()
-    
     data = request.json
     user_id = data.get('user_id')
     
-    if lock and lock.user_id != user_id:
+    # Take the lock, or extend the user's own lock, in one atomic step
+    result = seat_lock_store.acquire(showtime_id, [seat_id], user_id)
+    if not result.success:
         return jsonify({'error': 'Seat is locked by another user'}), 400
     
-    # Create or update the lock
-    expiry_time = current_time + timedelta(minutes=15)
-    
-    if lock:
-        lock.expires_at = expiry_time
-    else:
-        lock = SeatLocks(
-            showtime_id=showtime_id,
-            seat_id=seat_id,
-            user_id=user_id,
-            locked_at=current_time,
-            expires_at=expiry_time
-        )
-        db.session.add(lock)
-    
-    db.session.commit()
+    seat_state_engine.apply_lock(showtime_id, [seat_id], user_id, result.expires_at)
+    expiry_reaper.schedule(result.expires_at)
     
-    return jsonify({'message': 'Seat locked successfully', 'expires_at': expiry_time.isoformat()})
+    return jsonify({'message': 'Seat locked successfully', 'expires_at': result.expires_at.isoformat()})
 
 @seats_bp.route('/<int:showtime_id>/seats/<int:seat_id>/unlock', methods=['POST'])
 def unlock_seat(showtime_id, seat_id):
     data = request.json
     user_id = data.get('user_id')
     
-    # Check if the lock exists and belongs to the user
-    lock = db.session.execute(
-        select(SeatLocks).where(
-            SeatLocks.showtime_id == showtime_id,
-            SeatLocks.seat_id == seat_id,
-            SeatLocks.user_id == user_id
-        )
-    ).scalar_one_or_none()
-    
-    if not lock:
+    result = seat_lock_store.release(showtime_id, [seat_id], user_id)
+    if not result.success:
         return jsonify({'error': 'No active lock found for this user'}), 404
     
-    # Delete the lock
-    db.session.delete(lock)
-    db.session.commit()
+    seat_state_engine.apply_unlock(showtime_id, [seat_id])
     
     return jsonify({'message': 'Seat unlocked successfully'})
+
+def _seat_id_list(data):
+    """Validate the seat_ids field of a batch request; returns None if invalid"""
+    seat_ids = data.get('seat_ids') if data else None
+    if not isinstance(seat_ids, list) or not seat_ids:
+        return None
+    if not all(isinstance(seat_id, int) and not isinstance(seat_id, bool) for seat_id in seat_ids):
+        return None
+    # Keep request order but drop duplicates
+    return list(dict.fromkeys(seat_ids))
+
+@seats_bp.route('/<int:showtime_id>/seats/lock', methods=['POST'])
+@idempotent
+def lock_seats(showtime_id):
+    """Lock several seats at once, all or nothing"""
+    data = request.json
+    user_id = data.get('user_id') if data else None
+    seat_ids = _seat_id_list(data)
+    if user_id is None or seat_ids is None:
+        return jsonify({'error': 'user_id and a non-empty list of seat_ids are required'}), 400
+    
+    showtime = db.session.get(Showtimes, showtime_id)
+    if not showtime:
+        return jsonify({'error': 'Showtime not found'}), 404
+    
+    return _lock_seat_batch(showtime, user_id, seat_ids)
+
+def _lock_seat_batch(showtime, user_id, seat_ids):
+    """Lock seat_ids for user_id, all or nothing.
+    
+    One query reports screen membership and sold state for every requested
+    seat; the locks themselves are taken atomically by the seat lock store.
+    """
+    showtime_id = showtime.showtime_id
+    
+    try:
+        sold = (
+            select(Tickets.ticket_id)
+            .join(Reservations)
+            .where(
+                Reservations.showtime_id == showtime_id,
+                Reservations.status == 'confirmed',
+                Tickets.seat_id == Seats.seat_id
+            )
+            .exists()
+        )
+        rows = db.session.execute(
+            select(Seats.seat_id, sold.label('sold'))
+            .where(Seats.screen_id == showtime.screen_id, Seats.seat_id.in_(seat_ids))
+        ).all()
+        
+        found = {row.seat_id for row in rows}
+        conflicts = [
+            {'seat_id': seat_id, 'reason': 'not_on_screen'}
+            for seat_id in seat_ids if seat_id not in found
+        ]
+        conflicts.extend({'seat_id': row.seat_id, 'reason': 'sold'} for row in rows if row.sold)
+        if conflicts:
+            return jsonify({'error': 'One or more seats cannot be locked', 'conflicts': conflicts}), 400
+        
+        result = seat_lock_store.acquire(showtime_id, seat_ids, user_id)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error locking seats: {str(e)}")
+        return jsonify({'error': f'Failed to lock seats: {str(e)}'}), 500
+    
+    if not result.success:
+        conflicts = [{'seat_id': seat_id, 'reason': 'locked'} for seat_id in result.failed]
+        return jsonify({'error': 'One or more seats cannot be locked', 'conflicts': conflicts}), 400
+    
+    seat_state_engine.apply_lock(showtime_id, seat_ids, user_id, result.expires_at)
+    expiry_reaper.schedule(result.expires_at)
+    
+    return jsonify({
+        'message': 'Seats locked successfully',
+        'seat_ids': seat_ids,
+        'expires_at': result.expires_at.isoformat()
+    }), 200
+
+@seats_bp.route('/<int:showtime_id>/seats/extend', methods=['POST'])
+def extend_seat_locks(showtime_id):
+    """Push back the expiry of several of the user's live seat locks, all or nothing"""
+    data = request.json
+    user_id = data.get('user_id') if data else None
+    seat_ids = _seat_id_list(data)
+    if user_id is None or seat_ids is None:
+        return jsonify({'error': 'user_id and a non-empty list of seat_ids are required'}), 400
+    
+    try:
+        result = seat_lock_store.extend(showtime_id, seat_ids, user_id)
+    except Exception as e:
+        logger.error(f"Error extending seat locks: {str(e)}")
+        return jsonify({'error': f'Failed to extend seat locks: {str(e)}'}), 500
+    
+    if not result.success:
+        return jsonify({'error': 'No active lock found for this user', 'seat_ids': result.failed}), 404
+    
+    seat_state_engine.apply_lock(showtime_id, seat_ids, user_id, result.expires_at)
+    
+    return jsonify({
+        'message': 'Seat locks extended successfully',
+        'seat_ids': seat_ids,
+        'expires_at': result.expires_at.isoformat()
+    })
+
+@seats_bp.route('/<int:showtime_id>/seats/best', methods=['GET', 'POST'])
+def best_seats(showtime_id):
+    """Find the best block of adjacent available seats.
+    
+    Query parameters (GET) or JSON body (POST): count, optional class
+    ('standard' or 'premium'). A POST with user_id also locks the chosen seats.
+    """
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    try:
+        count = int(params.get('count', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count must be an integer', 'success': False}), 400
+    seat_class = params.get('class')
+    if count < 1 or (seat_class is not None and seat_class not in SEAT_CLASSES):
+        return jsonify({'error': 'count must be positive and class one of standard, premium',
+                        'success': False}), 400
+    
+    state = seat_state_engine.get(showtime_id)
+    if state is None:
+        return jsonify({'error': 'Showtime not found'}), 404
+    
+    _, status_codes = state.status_codes()
+    positions = find_best_block(state.layout, status_codes, count, seat_class)
+    if positions is None:
+        return jsonify({'error': f'No block of {count} adjacent seats available', 'success': False}), 404
+    
+    records = state.layout.records()
+    seats = [dict(records[position], status='available') for position in positions]
+    
+    if request.method == 'POST' and params.get('user_id') is not None:
+        showtime = db.session.get(Showtimes, showtime_id)
+        if showtime is None:
+            # Deleted since its seat state was loaded
+            seat_state_engine.invalidate(showtime_id)
+            return jsonify({'error': 'Showtime not found'}), 404
+        response, status = _lock_seat_batch(showtime, params['user_id'],
+                                            [seat['seat_id'] for seat in seats])
+        if status != 200:
+            return response, status
+        for seat in seats:
+            seat['status'] = 'locked'
+        return jsonify({'data': seats, 'expires_at': response.get_json()['expires_at'], 'success': True})
+    
+    return jsonify({'data': seats, 'success': True})
+
+@seats_bp.route('/<int:showtime_id>/seats/unlock', methods=['POST'])
+def unlock_seats(showtime_id):
+    """Release several of the user's seat locks at once, all or nothing"""
+    data = request.json
+    user_id = data.get('user_id') if data else None
+    seat_ids = _seat_id_list(data)
+    if user_id is None or seat_ids is None:
+        return jsonify({'error': 'user_id and a non-empty list of seat_ids are required'}), 400
+    
+    try:
+        result = seat_lock_store.release(showtime_id, seat_ids, user_id)
+    except Exception as e:
+        logger.error(f"Error unlocking seats: {str(e)}")
+        return jsonify({'error': f'Failed to unlock seats: {str(e)}'}), 500
+    
+    if not result.success:
+        return jsonify({'error': 'No active lock found for this user', 'seat_ids': result.failed}), 404
+    
+    seat_state_engine.apply_unlock(showtime_id, seat_ids)
+    
+    return jsonify({'message': 'Seats unlocked successfully', 'seat_ids': seat_ids})
@@ -2,8 +2,21 @@ from flask import Flask
 from flask_cors import CORS
 from config import Config
 from extensions import db
+from layout_cache import layout_cache
+from seat_state import seat_state_engine
+from seat_events import seat_event_hub
+from expiry import expiry_reaper
+from seat_locks import seat_lock_store
+from idempotency import idempotency_store
+from admission import admission_controller
+from booking import booking_pipeline
+from pricing import pricing_engine
+from capacity import capacity_counters
+from catalog_cache import catalog_cache
+from search_index import search_index
+from timetable import timetable
 # Import all DDL-first models to ensure they're registered
-from models import Base, Users, Movies, Cinemas, Screens, Seats, Showtimes, Reservations, Tickets, SeatLocks
+from models import Base, Users, Movies, Cinemas, Screens, Seats, Showtimes, Reservations, Tickets, SeatLocks, TicketPrices, SoldSeats, ShowtimeSeatCounts
 import os, sys
 import pymysql
 
@@ -22,6 +35,18 @@ def create_app():
     
     # Initialize extensions with the app
     db.init_app(app)
+    layout_cache.init_app(app, db)
+    seat_state_engine.init_app(app, db)
+    seat_event_hub.init_app(app)
+    seat_lock_store.init_app(app, db)
+    idempotency_store.init_app(app)
+    admission_controller.init_app(app)
+    booking_pipeline.init_app(app, db)
+    pricing_engine.init_app(app, db)
+    catalog_cache.init_app(app)
+    search_index.init_app(app, db)
+    timetable.init_app(app, db)
+    seat_state_engine.add_listener(seat_event_hub.publish)
 
     # Import and register blueprints
     from api.v1.auth.login.route import login_bp
@@ -33,9 +58,18 @@ def create_app():
     from api.v1.movies.route import movies_bp
     app.register_blueprint(movies_bp, url_prefix='/api/v1/movies')
     
+    from api.v1.showtimes.route import showtimes_bp
+    app.register_blueprint(showtimes_bp, url_prefix='/api/v1/showtimes')
+    
     from api.v1.showtimes.showtimeId.seats.route import seats_bp
     app.register_blueprint(seats_bp, url_prefix='/api/v1/showtimes')
     
+    from api.v1.showtimes.showtimeId.queue.route import queue_bp
+    app.register_blueprint(queue_bp, url_prefix='/api/v1/showtimes')
+    
+    from api.v1.showtimes.showtimeId.quote.route import quote_bp
+    app.register_blueprint(quote_bp, url_prefix='/api/v1/showtimes')
+    
     from api.v1.reservations.route import reservations_bp
     app.register_blueprint(reservations_bp, url_prefix='/api/v1/reservations')
     
@@ -48,10 +82,23 @@ def create_app():
     from api.v1.admin.showtimes.route import showtimes_bp as admin_showtimes_bp
     app.register_blueprint(admin_showtimes_bp, url_prefix='/api/v1/admin/showtimes')
     
+    from api.v1.admin.metrics.route import metrics_bp
+    app.register_blueprint(metrics_bp, url_prefix='/api/v1/admin/metrics')
+    
     # DDL-first database initialization
     # Create database tables from DDL-generated models
     with app.app_context():
         Base.metadata.create_all(bind=db.engine)
+        # Refuse to start without a complete price matrix (create_all leaves ticket_prices empty)
+        pricing_engine.verify()
+        # Movie search answers from memory; index the catalog up front
+        search_index.build()
+        timetable.load()
+    
+    # Background expiry of seat locks and pending reservations
+    expiry_reaper.init_app(app, db)
+    # Background reconciliation of the showtime seat counters
+    capacity_counters.init_app(app, db)
 
     return app
 
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Booking throughput benchmark.
+
+Books seats of one showtime from many threads at once and reports
+reservations per second for each booking path:
+
+    procedure     one sp_create_reservation call per request
+    group_commit  BookingPipeline micro-batches
+    optimistic    no row locks, conflicts caught by the sold_seats key
+
+A temporary screen with --seats seats and a showtime on it are created in the
+configured database and deleted at the end. Each thread books --party
+adjacent seats at a time; --overlap makes every request also ask for its
+neighbour's first seat, so roughly half the requests conflict.
+
+Usage:
+    python benchmarks/booking_throughput.py --threads 32 --seats 2000
+    python benchmarks/booking_throughput.py --mode group_commit --overlap
+    python benchmarks/booking_throughput.py --mode optimistic --overlap
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from app import create_app
+from booking import BookingRejected, booking_pipeline, call_create_reservation
+from extensions import db
+from models import Cinemas, Movies, Screens, Seats, Showtimes, Users
+
+SEATS_PER_ROW = 20
+MODES = ('procedure', 'group_commit', 'optimistic')
+
+
+def create_fixture(size):
+    """Temporary screen, seats and showtime; returns (screen_id, showtime_id, seat_ids, user_ids)"""
+    cinema_id = db.session.execute(select(Cinemas.cinema_id).limit(1)).scalar_one()
+    movie = db.session.execute(select(Movies).limit(1)).scalar_one()
+    user_ids = db.session.execute(select(Users.user_id)).scalars().all()
+
+    screen = Screens(cinema_id=cinema_id, name=f'bench-booking-{int(time.time())}')
+    db.session.add(screen)
+    db.session.flush()
+    db.session.execute(Seats.__table__.insert(), [
+        {
+            'screen_id': screen.screen_id,
+            'seat_class': 'standard',
+            'seat_label': f'{index // SEATS_PER_ROW + 1}-{index % SEATS_PER_ROW + 1}',
+            'row_num': index // SEATS_PER_ROW + 1,
+            'col_num': index % SEATS_PER_ROW + 1
+        }
+        for index in range(size)
+    ])
+    seat_ids = db.session.execute(
+        select(Seats.seat_id).where(Seats.screen_id == screen.screen_id).order_by(Seats.seat_id)
+    ).scalars().all()
+    start = datetime.utcnow() + timedelta(days=30)
+    showtime = Showtimes(movie_id=movie.movie_id, screen_id=screen.screen_id, start_time=start,
+                         end_time=start + timedelta(minutes=movie.duration or 120))
+    db.session.add(showtime)
+    db.session.commit()
+    return screen.screen_id, showtime.showtime_id, seat_ids, user_ids
+
+
+def book_with_procedure(user_id, showtime_id, seat_ids):
+    connection = db.session.connection()
+    try:
+        call_create_reservation(connection, user_id, showtime_id, seat_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', choices=MODES + ('all',), default='all')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seats', type=int, default=2000)
+    parser.add_argument('--party', type=int, default=2)
+    parser.add_argument('--overlap', action='store_true')
+    args = parser.parse_args()
+
+    app = create_app()
+    modes = MODES if args.mode == 'all' else (args.mode,)
+    with app.app_context():
+        for mode in modes:
+            screen_id, showtime_id, seat_ids, user_ids = create_fixture(args.seats)
+            requests = [
+                seat_ids[start:start + args.party] + ([seat_ids[start + args.party]] if args.overlap else [])
+                for start in range(0, len(seat_ids) - args.party, args.party)
+            ]
+            next_request = iter(enumerate(requests))
+            next_lock = threading.Lock()
+            counts = {'booked': 0, 'rejected': 0, 'errors': 0}
+
+            def worker():
+                with app.app_context():
+                    while True:
+                        with next_lock:
+                            item = next(next_request, None)
+                        if item is None:
+                            return
+                        index, seats = item
+                        user_id = user_ids[index % len(user_ids)]
+                        try:
+                            if mode == 'procedure':
+                                book_with_procedure(user_id, showtime_id, seats)
+                            elif mode == 'group_commit':
+                                booking_pipeline.submit(user_id, showtime_id, seats)
+                            else:
+                                booking_pipeline.book_optimistic(user_id, showtime_id, seats)
+                            outcome = 'booked'
+                        except BookingRejected:
+                            outcome = 'rejected'
+                        except Exception as e:
+                            outcome = 'rejected' if 'already sold' in str(e) else 'errors'
+                        with next_lock:
+                            counts[outcome] += 1
+
+            try:
+                started = time.perf_counter()
+                threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+                print(f"{mode:>12}: {counts['booked'] / elapsed:8.1f} reservations/s "
+                      f"({counts['booked']} booked, {counts['rejected']} rejected, "
+                      f"{counts['errors']} errors in {elapsed:.2f}s)")
+            finally:
+                db.session.rollback()
+                db.session.query(Screens).filter(Screens.screen_id == screen_id).delete()
+                db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
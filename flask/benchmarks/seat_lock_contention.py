@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Seat lock contention benchmark.
+
+Worker threads repeatedly try to lock a random block of adjacent seats out of
+a small hot set, hold it briefly and release it. Reports attempts per second,
+the share of attempts that lost to another user and the share that failed
+with an error.
+
+Backends:
+    memory  InMemorySeatLockStore, no database needed
+    sql     SqlSeatLockStore against the configured database
+    naive   the old SELECT-then-INSERT locking, for comparison (database)
+
+The database backends use the first showtime, the first seats of its screen
+and the first users in the database; the seat_locks rows they touch are
+removed before and after the run.
+
+Usage:
+    python benchmarks/seat_lock_contention.py --backend memory --threads 16
+    python benchmarks/seat_lock_contention.py --backend sql --seats 40 --party 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seat_locks import InMemorySeatLockStore, LockResult, SqlSeatLockStore
+
+TTL = timedelta(seconds=30)
+
+
+class NaiveSeatLocks:
+    """The read-then-write locking the seat routes used before SeatLockStore"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def acquire(self, showtime_id, seat_ids, user_id, ttl):
+        from models import SeatLocks
+        session = self._db.session
+        now = datetime.utcnow()
+        try:
+            held = session.query(SeatLocks).filter(
+                SeatLocks.showtime_id == showtime_id,
+                SeatLocks.seat_id.in_(seat_ids),
+                SeatLocks.expires_at > now
+            ).all()
+            failed = [lock.seat_id for lock in held if lock.user_id != user_id]
+            if failed:
+                session.rollback()
+                return LockResult(False, failed)
+            mine = {lock.seat_id: lock for lock in held}
+            for seat_id in seat_ids:
+                if seat_id in mine:
+                    mine[seat_id].expires_at = now + ttl
+                else:
+                    session.add(SeatLocks(showtime_id=showtime_id, seat_id=seat_id, user_id=user_id,
+                                          locked_at=now, expires_at=now + ttl))
+            session.commit()
+            return LockResult(True, [], now + ttl)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.remove()
+
+    def release(self, showtime_id, seat_ids, user_id):
+        from models import SeatLocks
+        session = self._db.session
+        try:
+            session.query(SeatLocks).filter(
+                SeatLocks.showtime_id == showtime_id,
+                SeatLocks.seat_id.in_(seat_ids),
+                SeatLocks.user_id == user_id
+            ).delete(synchronize_session=False)
+            session.commit()
+            return LockResult(True, [])
+        finally:
+            session.remove()
+
+
+def run(store, showtime_id, seat_ids, user_ids, threads, duration, party, hold):
+    """Hammer store from several threads; returns (attempts, acquired, conflicts, errors)"""
+    totals = [0, 0, 0, 0]
+    totals_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(user_id):
+        counts = [0, 0, 0, 0]
+        rng = random.Random(user_id)
+        while time.perf_counter() < deadline:
+            start = rng.randrange(len(seat_ids) - party + 1)
+            block = seat_ids[start:start + party]
+            counts[0] += 1
+            try:
+                result = store.acquire(showtime_id, block, user_id, TTL)
+            except Exception:
+                counts[3] += 1
+                continue
+            if not result.success:
+                counts[2] += 1
+                continue
+            counts[1] += 1
+            if hold:
+                time.sleep(hold)
+            store.release(showtime_id, block, user_id)
+        with totals_lock:
+            for index, value in enumerate(counts):
+                totals[index] += value
+
+    workers = [threading.Thread(target=worker, args=(user_ids[index % len(user_ids)],))
+               for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return tuple(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--backend', choices=('memory', 'sql', 'naive'), default='memory')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds')
+    parser.add_argument('--seats', type=int, default=40, help='size of the hot seat set')
+    parser.add_argument('--party', type=int, default=2, help='seats per lock request')
+    parser.add_argument('--hold', type=float, default=0.001, help='seconds a lock is held')
+    args = parser.parse_args()
+
+    if args.backend == 'memory':
+        counts = run(InMemorySeatLockStore(), 1, list(range(1, args.seats + 1)),
+                     list(range(1, args.threads + 1)), args.threads, args.duration, args.party, args.hold)
+    else:
+        from app import create_app
+        from extensions import db
+        from models import SeatLocks, Seats, Showtimes, Users
+
+        app = create_app()
+        with app.app_context():
+            showtime = db.session.query(Showtimes).order_by(Showtimes.showtime_id).first()
+            seat_ids = [seat_id for (seat_id,) in db.session.query(Seats.seat_id)
+                        .filter(Seats.screen_id == showtime.screen_id)
+                        .order_by(Seats.seat_id).limit(args.seats)]
+            user_ids = [user_id for (user_id,) in db.session.query(Users.user_id)
+                        .order_by(Users.user_id).limit(args.threads)]
+            if len(seat_ids) < args.party or not user_ids:
+                sys.exit('Not enough seats or users in the database for this benchmark')
+
+            def clear():
+                db.session.query(SeatLocks).filter(
+                    SeatLocks.showtime_id == showtime.showtime_id,
+                    SeatLocks.seat_id.in_(seat_ids)
+                ).delete(synchronize_session=False)
+                db.session.commit()
+
+            clear()
+            store = SqlSeatLockStore(db) if args.backend == 'sql' else NaiveSeatLocks(db)
+
+            def in_context(target):
+                def wrapped(*a):
+                    with app.app_context():
+                        return target(*a)
+                return wrapped
+
+            # Each worker needs an application context for db.engine / db.session
+            store.acquire = in_context(store.acquire)
+            store.release = in_context(store.release)
+            counts = run(store, showtime.showtime_id, seat_ids, user_ids,
+                         args.threads, args.duration, args.party, args.hold)
+            clear()
+
+    attempts, acquired, conflicts, errors = counts
+    print(f"backend={args.backend} threads={args.threads} seats={args.seats} party={args.party}")
+    print(f"  attempts:      {attempts} ({attempts / args.duration:,.0f}/s)")
+    print(f"  acquired:      {acquired} ({acquired / args.duration:,.0f}/s)")
+    if attempts:
+        print(f"  conflict rate: {conflicts / attempts:.1%}")
+        print(f"  error rate:    {errors / attempts:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Seat status query benchmark.
+
+Compares building a showtime's seat map with the old multi-query approach
+(ORM seats + v_available_seats + ORM locks, reconciled in Python) against the
+single set-based query in seat_status.py, streamed into JSON.
+
+For each screen size a temporary screen with that many seats and a showtime
+on it are created in the configured database, with 20% of the seats sold and
+10% locked. They are deleted again at the end (the foreign keys cascade).
+
+Usage:
+    python benchmarks/seat_status_query.py
+    python benchmarks/seat_status_query.py --sizes 100 500 2000 --repeat 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+
+from app import create_app
+from extensions import db
+from models import Cinemas, Movies, Reservations, SeatLocks, Seats, Screens, Showtimes, Tickets, Users
+from seat_status import iter_seats_json, stream_seat_statuses
+from serializers import ModelSerializer
+
+SEATS_PER_ROW = 20
+
+
+def multi_query(showtime_id):
+    """The seat map as the [id]/seats route used to build it"""
+    showtime = db.session.get(Showtimes, showtime_id)
+    seats = db.session.execute(
+        select(Seats).where(Seats.screen_id == showtime.screen_id)
+    ).scalars().all()
+    available_seat_ids = {
+        row.seat_id for row in db.session.execute(
+            text("SELECT seat_id FROM v_available_seats WHERE showtime_id = :showtime_id"),
+            {'showtime_id': showtime_id}
+        )
+    }
+    locked_seat_ids = {
+        lock.seat_id for lock in db.session.execute(
+            select(SeatLocks).where(
+                SeatLocks.showtime_id == showtime_id,
+                SeatLocks.expires_at > datetime.utcnow()
+            )
+        ).scalars().all()
+    }
+    result = []
+    for seat in seats:
+        seat_dict = ModelSerializer.serialize_seats(seat)
+        if seat.seat_id in available_seat_ids:
+            seat_dict['status'] = 'available'
+        elif seat.seat_id in locked_seat_ids:
+            seat_dict['status'] = 'locked'
+        else:
+            seat_dict['status'] = 'sold'
+        result.append(seat_dict)
+    body = json.dumps(result)
+    db.session.remove()
+    return body
+
+
+def single_query(showtime_id):
+    """The seat map from the set-based status query"""
+    with db.engine.connect() as conn:
+        return ''.join(iter_seats_json(stream_seat_statuses(conn, showtime_id)))
+
+
+def create_fixture(size):
+    """Screen, seats, showtime, sold and locked seats; returns (screen_id, showtime_id)"""
+    cinema_id = db.session.execute(select(Cinemas.cinema_id).limit(1)).scalar_one()
+    movie = db.session.execute(select(Movies).limit(1)).scalar_one()
+    user_id = db.session.execute(select(Users.user_id).limit(1)).scalar_one()
+
+    screen = Screens(cinema_id=cinema_id, name=f'bench-{size}-{int(time.time())}')
+    db.session.add(screen)
+    db.session.flush()
+    db.session.execute(Seats.__table__.insert(), [
+        {
+            'screen_id': screen.screen_id,
+            'seat_class': 'standard',
+            'seat_label': f'{index // SEATS_PER_ROW + 1}-{index % SEATS_PER_ROW + 1}',
+            'row_num': index // SEATS_PER_ROW + 1,
+            'col_num': index % SEATS_PER_ROW + 1
+        }
+        for index in range(size)
+    ])
+    seat_ids = db.session.execute(
+        select(Seats.seat_id).where(Seats.screen_id == screen.screen_id).order_by(Seats.seat_id)
+    ).scalars().all()
+
+    start = datetime.utcnow() + timedelta(days=30)
+    showtime = Showtimes(movie_id=movie.movie_id, screen_id=screen.screen_id, start_time=start,
+                         end_time=start + timedelta(minutes=movie.duration or 120))
+    db.session.add(showtime)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    reservation = Reservations(user_id=user_id, showtime_id=showtime.showtime_id, status='confirmed',
+                               created_at=now, expires_at=now + timedelta(minutes=15))
+    db.session.add(reservation)
+    db.session.flush()
+    db.session.execute(Tickets.__table__.insert(), [
+        {'reservation_id': reservation.reservation_id, 'seat_id': seat_id, 'price': 10}
+        for seat_id in seat_ids[::5]
+    ])
+    db.session.execute(SeatLocks.__table__.insert(), [
+        {'showtime_id': showtime.showtime_id, 'seat_id': seat_id, 'user_id': user_id,
+         'locked_at': now, 'expires_at': now + timedelta(hours=1)}
+        for seat_id in seat_ids[1::10]
+    ])
+    db.session.commit()
+    return screen.screen_id, showtime.showtime_id
+
+
+def timed(function, showtime_id, repeat):
+    function(showtime_id)  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(showtime_id)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"{'seats':>6} {'multi-query ms':>15} {'single query ms':>16} {'speedup':>8}")
+        for size in args.sizes:
+            screen_id, showtime_id = create_fixture(size)
+            try:
+                multi = json.loads(multi_query(showtime_id))
+                single = json.loads(single_query(showtime_id))
+                key = lambda seat: seat['seat_id']
+                if sorted(multi, key=key) != sorted(single, key=key):
+                    print(f"  warning: results differ at {size} seats")
+                old = timed(multi_query, showtime_id, args.repeat)
+                new = timed(single_query, showtime_id, args.repeat)
+                print(f"{size:>6} {old:>15.2f} {new:>16.2f} {old / new:>7.1f}x")
+            finally:
+                db.session.rollback()
+                db.session.query(Screens).filter(Screens.screen_id == screen_id).delete()
+                db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+"""
+Reservation booking paths.
+
+``procedure`` (default) runs sp_create_reservation once per request.
+
+``group_commit`` coalesces concurrent bookings for the same showtime into
+micro-batches. Bookings of one showtime serialize on the showtime row lock
+anyway, so instead of queueing N transactions behind it, one transaction
+takes the lock once, checks every request of the batch against sold and
+locked seats (and against the seats won earlier in the same batch), rejects
+the conflicting ones individually and writes all winning reservations and
+tickets together. The same locks are taken in the same order as the
+procedure, so both paths can run side by side.
+
+Batches are run by one of the waiting request threads (the leader) rather
+than a background worker: the first booking to arrive for an idle showtime
+waits BOOKING_BATCH_WINDOW seconds for company, runs the batch, and hands
+leadership to the next waiting request if more have queued up meanwhile.
+
+``optimistic`` takes no row locks at all. The ``sold_seats`` table holds one
+row per ticketed seat with (showtime_id, seat_id) as its primary key, filled
+by the trg_ticket_claim_seat trigger, so inserting the tickets is itself the
+conflict check: of two bookings racing for a seat, the second one's insert
+fails with a duplicate key and its transaction is rolled back. Bookings of
+different seats in the same showtime never wait for each other.
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from layout_cache import layout_cache
+from metrics import metrics
+from models import Reservations, SeatLocks, Screens, Seats, Showtimes, Tickets
+from pricing import PricingError, pricing_engine
+
+RESERVATION_MINUTES = 15
+
+BOOKING_MODES = ('procedure', 'group_commit', 'optimistic')
+
+# MySQL error code for a duplicate key
+_ER_DUP_ENTRY = 1062
+
+BookingResult = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+
+class BookingRejected(Exception):
+    """A booking failed validation; messages match sp_create_reservation's"""
+
+
+def _row_dict(cursor, row):
+    """Map a DB-API row to a dict keyed by the cursor's column names"""
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def call_create_reservation(connection, user_id: int, showtime_id: int, seat_ids: List[int]) -> BookingResult:
+    """CALL sp_create_reservation on a SQLAlchemy connection.
+
+    Tickets are charged from the pricing engine's matrix, passed in as JSON.
+    The procedure returns the reservation row and then its ticket rows as two
+    result sets, read here from the DB-API cursor.
+    """
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            "CALL sp_create_reservation(%s, %s, %s, %s)",
+            (user_id, showtime_id, json.dumps(seat_ids), json.dumps(pricing_engine.price_matrix()))
+        )
+        reservation = _row_dict(cursor, cursor.fetchone())
+        cursor.nextset()
+        tickets = [_row_dict(cursor, row) for row in cursor.fetchall()]
+        while cursor.nextset():
+            pass
+    finally:
+        cursor.close()
+    return reservation, tickets
+
+
+class _Booking:
+    __slots__ = ('user_id', 'seat_ids', 'done', 'lead', 'result', 'error')
+
+    def __init__(self, user_id: int, seat_ids: List[int]):
+        self.user_id = user_id
+        self.seat_ids = seat_ids
+        self.done = threading.Event()
+        self.lead = False
+        self.result: Optional[BookingResult] = None
+        self.error: Optional[Exception] = None
+
+
+class _ShowtimeQueue:
+    __slots__ = ('pending', 'leader_active')
+
+    def __init__(self):
+        self.pending: 'deque[_Booking]' = deque()
+        self.leader_active = False
+
+
+class BookingPipeline:
+    """Booking paths that bypass sp_create_reservation: group commit and optimistic"""
+
+    def __init__(self):
+        self._db = None
+        self._queues: Dict[int, _ShowtimeQueue] = {}
+        self._lock = threading.Lock()
+        self.mode = 'procedure'
+        self.batch_window = 0.005
+        self.max_batch = 64
+
+    def init_app(self, app, db):
+        self._db = db
+        self.mode = app.config.get('BOOKING_MODE', 'procedure')
+        if self.mode not in BOOKING_MODES:
+            raise ValueError(f"Unknown BOOKING_MODE: {self.mode}")
+        self.batch_window = float(app.config.get('BOOKING_BATCH_WINDOW', 0.005))
+        self.max_batch = int(app.config.get('BOOKING_BATCH_MAX', 64))
+
+    @property
+    def group_commit(self) -> bool:
+        return self.mode == 'group_commit'
+
+    def book(self, user_id: int, showtime_id: int, seat_ids: List[int]) -> BookingResult:
+        """Book seats with the configured non-procedure path"""
+        if self.group_commit:
+            return self.submit(user_id, showtime_id, seat_ids)
+        return self.book_optimistic(user_id, showtime_id, seat_ids)
+
+    def submit(self, user_id: int, showtime_id: int, seat_ids: List[int]) -> BookingResult:
+        """Book seats as part of the next batch for the showtime; blocks until done"""
+        booking = _Booking(user_id, list(dict.fromkeys(seat_ids)))
+        with self._lock:
+            queue = self._queues.get(showtime_id)
+            if queue is None:
+                queue = self._queues[showtime_id] = _ShowtimeQueue()
+            queue.pending.append(booking)
+            if not queue.leader_active:
+                queue.leader_active = booking.lead = True
+
+        if not booking.lead:
+            booking.done.wait()
+        if booking.lead:
+            self._lead(showtime_id, queue)
+            booking.done.wait()
+
+        if booking.error is not None:
+            raise booking.error
+        return booking.result
+
+    def _lead(self, showtime_id: int, queue: _ShowtimeQueue):
+        """Run one batch, then pass leadership on (or retire the queue)"""
+        time.sleep(self.batch_window)
+        with self._lock:
+            batch = [queue.pending.popleft() for _ in range(min(self.max_batch, len(queue.pending)))]
+
+        try:
+            with metrics.timer('booking.batch'):
+                self._run_batch(showtime_id, batch)
+        except Exception as e:
+            for booking in batch:
+                if booking.result is None and booking.error is None:
+                    booking.error = e
+        metrics.incr('booking.batches')
+        metrics.incr('booking.requests', len(batch))
+
+        with self._lock:
+            if queue.pending:
+                successor = queue.pending[0]
+                successor.lead = True
+                successor.done.set()
+            else:
+                queue.leader_active = False
+                del self._queues[showtime_id]
+        for booking in batch:
+            booking.done.set()
+
+    def _run_batch(self, showtime_id: int, batch: List[_Booking]):
+        now = datetime.utcnow().replace(microsecond=0)
+        expires_at = now + timedelta(minutes=RESERVATION_MINUTES)
+        requested = sorted({seat_id for booking in batch for seat_id in booking.seat_ids})
+
+        with self._db.engine.begin() as conn:
+            # 1. Lock the showtime row, then the requested seats in seat_id order
+            showtime = conn.execute(
+                select(Showtimes.screen_id, Screens.screen_format)
+                .join(Screens, Screens.screen_id == Showtimes.screen_id)
+                .where(Showtimes.showtime_id == showtime_id)
+                .with_for_update()
+            ).first()
+            if showtime is None:
+                for booking in batch:
+                    booking.error = BookingRejected('Showtime not found')
+                return
+            seats = {
+                row.seat_id: row
+                for row in conn.execute(
+                    select(Seats.seat_id, Seats.screen_id, Seats.seat_class, Seats.seat_label)
+                    .where(Seats.seat_id.in_(requested))
+                    .order_by(Seats.seat_id)
+                    .with_for_update()
+                )
+            }
+
+            # 2. Current sold and live-locked seats among everything requested
+            taken = set(conn.execute(
+                select(Tickets.seat_id)
+                .join(Reservations, Reservations.reservation_id == Tickets.reservation_id)
+                .where(Reservations.showtime_id == showtime_id, Tickets.seat_id.in_(requested))
+            ).scalars().all())
+            lock_owners = dict(conn.execute(
+                select(SeatLocks.seat_id, SeatLocks.user_id).where(
+                    SeatLocks.showtime_id == showtime_id,
+                    SeatLocks.seat_id.in_(requested),
+                    SeatLocks.expires_at > now
+                )
+            ).all())
+
+            # 3. Validate and price in arrival order; winners claim their seats for later requests
+            winners = []
+            prices: Dict[_Booking, Dict[int, Any]] = {}
+            for booking in batch:
+                if any(seat_id not in seats or seats[seat_id].screen_id != showtime.screen_id
+                       for seat_id in booking.seat_ids):
+                    booking.error = BookingRejected('One or more seats do not belong to the showtime screen')
+                elif any(seat_id in taken for seat_id in booking.seat_ids):
+                    booking.error = BookingRejected('One or more seats already sold')
+                elif any(lock_owners.get(seat_id, booking.user_id) != booking.user_id
+                         for seat_id in booking.seat_ids):
+                    booking.error = BookingRejected('Seat currently locked by another user')
+                else:
+                    try:
+                        prices[booking] = {
+                            seat_id: pricing_engine.price(seats[seat_id].seat_class, showtime.screen_format)
+                            for seat_id in booking.seat_ids
+                        }
+                    except PricingError as e:
+                        # Only this booking fails; the rest of the batch goes ahead
+                        booking.error = BookingRejected(str(e))
+                        continue
+                    taken.update(booking.seat_ids)
+                    winners.append(booking)
+            metrics.incr('booking.rejected', len(batch) - len(winners))
+            if not winners:
+                return
+
+            # 4. Write every winning reservation, then all their tickets at once
+            reservation_ids = {}
+            for booking in winners:
+                reservation_ids[booking] = conn.execute(
+                    insert(Reservations).values(
+                        user_id=booking.user_id, showtime_id=showtime_id, status='confirmed',
+                        created_at=now, expires_at=expires_at
+                    )
+                ).inserted_primary_key[0]
+            conn.execute(insert(Tickets), [
+                {
+                    'reservation_id': reservation_ids[booking],
+                    'seat_id': seat_id,
+                    'price': prices[booking][seat_id],
+                    'issued_at': now
+                }
+                for booking in winners
+                for seat_id in booking.seat_ids
+            ])
+
+            # 5. Remove the winners' now-used locks
+            conn.execute(delete(SeatLocks).where(
+                SeatLocks.showtime_id == showtime_id,
+                tuple_(SeatLocks.user_id, SeatLocks.seat_id).in_([
+                    (booking.user_id, seat_id) for booking in winners for seat_id in booking.seat_ids
+                ])
+            ))
+
+            tickets_by_reservation: Dict[int, List[Dict[str, Any]]] = {}
+            for row in conn.execute(
+                select(Tickets.ticket_id, Tickets.reservation_id, Tickets.seat_id, Tickets.price, Tickets.issued_at)
+                .where(Tickets.reservation_id.in_(list(reservation_ids.values())))
+                .order_by(Tickets.ticket_id)
+            ):
+                ticket = dict(row._mapping, seat_label=seats[row.seat_id].seat_label)
+                tickets_by_reservation.setdefault(row.reservation_id, []).append(ticket)
+
+        for booking in winners:
+            reservation_id = reservation_ids[booking]
+            booking.result = (
+                {
+                    'reservation_id': reservation_id,
+                    'user_id': booking.user_id,
+                    'showtime_id': showtime_id,
+                    'status': 'confirmed',
+                    'created_at': now,
+                    'expires_at': expires_at
+                },
+                tickets_by_reservation.get(reservation_id, [])
+            )
+
+    def book_optimistic(self, user_id: int, showtime_id: int, seat_ids: List[int]) -> BookingResult:
+        """Book seats without row locks; sold_seats' primary key rejects a double sale"""
+        seat_ids = list(dict.fromkeys(seat_ids))
+        now = datetime.utcnow().replace(microsecond=0)
+        expires_at = now + timedelta(minutes=RESERVATION_MINUTES)
+
+        try:
+            with self._db.engine.begin() as conn:
+                # 1. Plain reads: the showtime's screen and the (cached) seat layout
+                showtime = conn.execute(
+                    select(Showtimes.screen_id, Screens.screen_format)
+                    .join(Screens, Screens.screen_id == Showtimes.screen_id)
+                    .where(Showtimes.showtime_id == showtime_id)
+                ).first()
+                if showtime is None:
+                    raise BookingRejected('Showtime not found')
+                layout = layout_cache.get(showtime.screen_id, conn)
+                if any(seat_id not in layout.index for seat_id in seat_ids):
+                    raise BookingRejected('One or more seats do not belong to the showtime screen')
+
+                # 2. Seats held by someone else; a lock taken after this read
+                #    is advisory only, the sold_seats key still decides
+                if conn.execute(
+                    select(SeatLocks.seat_id).where(
+                        SeatLocks.showtime_id == showtime_id,
+                        SeatLocks.seat_id.in_(seat_ids),
+                        SeatLocks.user_id != user_id,
+                        SeatLocks.expires_at > now
+                    ).limit(1)
+                ).first() is not None:
+                    raise BookingRejected('Seat currently locked by another user')
+
+                # 3. Write the reservation and tickets; the trigger claims each seat
+                reservation_id = conn.execute(
+                    insert(Reservations).values(
+                        user_id=user_id, showtime_id=showtime_id, status='confirmed',
+                        created_at=now, expires_at=expires_at
+                    )
+                ).inserted_primary_key[0]
+                conn.execute(insert(Tickets), [
+                    {
+                        'reservation_id': reservation_id,
+                        'seat_id': seat_id,
+                        'price': pricing_engine.price(
+                            layout.seat_class(layout.index[seat_id]), showtime.screen_format
+                        ),
+                        'issued_at': now
+                    }
+                    for seat_id in seat_ids
+                ])
+
+                # 4. Remove the user's now-used locks
+                conn.execute(delete(SeatLocks).where(
+                    SeatLocks.showtime_id == showtime_id,
+                    SeatLocks.user_id == user_id,
+                    SeatLocks.seat_id.in_(seat_ids)
+                ))
+
+                tickets = [
+                    dict(row._mapping, seat_label=layout.labels[layout.index[row.seat_id]])
+                    for row in conn.execute(
+                        select(Tickets.ticket_id, Tickets.reservation_id, Tickets.seat_id, Tickets.price, Tickets.issued_at)
+                        .where(Tickets.reservation_id == reservation_id)
+                        .order_by(Tickets.ticket_id)
+                    )
+                ]
+        except IntegrityError as e:
+            if getattr(e.orig, 'args', (None,))[0] != _ER_DUP_ENTRY:
+                raise
+            metrics.incr('booking.conflicts')
+            raise BookingRejected('One or more seats already sold') from e
+        except BookingRejected:
+            metrics.incr('booking.rejected')
+            raise
+
+        metrics.incr('booking.requests')
+        reservation = {
+            'reservation_id': reservation_id,
+            'user_id': user_id,
+            'showtime_id': showtime_id,
+            'status': 'confirmed',
+            'created_at': now,
+            'expires_at': expires_at
+        }
+        return reservation, tickets
+
+
+booking_pipeline = BookingPipeline()
@@ -0,0 +1,253 @@
+"""
+Live seat counts per showtime.
+
+The ``showtime_seat_counts`` table holds capacity, sold and held figures for
+every showtime, kept current by triggers on showtimes, seats, tickets and
+seat_locks, so "12 seats left" is a primary-key lookup instead of a scan of
+tickets and locks. Each showtime's counts are spread over COUNTER_SLOTS rows
+(by seat_id % COUNTER_SLOTS) so that concurrent bookings of different seats
+rarely wait on the same row; readers add the slots up.
+
+``held`` counts seat_locks rows, so a lock that has expired but not yet been
+removed by the expiry reaper is still counted. Locks kept by the in-memory
+lock backend are not counted at all.
+
+Counters can drift from the rows they summarise (rows removed by cascading
+deletes do not fire triggers, manual fixes, a trigger missing on an older
+database). A reconciliation pass recomputes them from the source tables every
+CAPACITY_RECONCILE_INTERVAL seconds and repairs the showtimes that differ.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+
+from metrics import metrics
+from models import Reservations, SeatLocks, Seats, ShowtimeSeatCounts, Showtimes, Tickets
+
+logger = logging.getLogger(__name__)
+
+# Must match the ``% 8`` in the trg_counts_* triggers
+COUNTER_SLOTS = 8
+
+# (showtime_id, slot) -> [capacity, sold, held]
+SlotCounts = Dict[Tuple[int, int], List[int]]
+
+
+def availability(capacity: int, sold: int, held: int) -> Dict[str, Any]:
+    """Public shape of a showtime's counts"""
+    available = max(0, capacity - sold - held)
+    return {
+        'capacity': capacity,
+        'sold': sold,
+        'held': held,
+        'available': available,
+        'sold_out': capacity > 0 and sold >= capacity
+    }
+
+
+class CapacityCounters:
+    """Reads and reconciles the showtime_seat_counts table"""
+
+    def __init__(self):
+        self._app = None
+        self._db = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.interval = 300.0
+        self.selling_fast_ratio = 0.2
+
+    def init_app(self, app, db):
+        self._app = app
+        self._db = db
+        self.selling_fast_ratio = float(app.config.get('SELLING_FAST_RATIO', 0.2))
+        # Seconds between reconciliation passes; 0 disables the background pass
+        self.interval = float(app.config.get('CAPACITY_RECONCILE_INTERVAL', 300))
+        if self.interval > 0:
+            self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='capacity-reconciler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        with self._app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"Seat count reconciliation failed: {str(e)}")
+                    metrics.incr('capacity.errors')
+
+    def get(self, showtime_id: int, conn=None) -> Optional[Dict[str, Any]]:
+        """Counts for one showtime, or None if it has none"""
+        return self.get_many([showtime_id], conn).get(showtime_id)
+
+    def get_many(self, showtime_ids: Iterable[int], conn=None) -> Dict[int, Dict[str, Any]]:
+        """Counts for several showtimes in one primary-key range query"""
+        showtime_ids = list(showtime_ids)
+        if not showtime_ids:
+            return {}
+        query = (
+            select(
+                ShowtimeSeatCounts.showtime_id,
+                func.sum(ShowtimeSeatCounts.capacity).label('capacity'),
+                func.sum(ShowtimeSeatCounts.sold).label('sold'),
+                func.sum(ShowtimeSeatCounts.held).label('held')
+            )
+            .where(ShowtimeSeatCounts.showtime_id.in_(showtime_ids))
+            .group_by(ShowtimeSeatCounts.showtime_id)
+        )
+        if conn is not None:
+            rows = conn.execute(query).all()
+        else:
+            with self._db.engine.connect() as own_conn:
+                rows = own_conn.execute(query).all()
+        return {
+            row.showtime_id: availability(int(row.capacity), int(row.sold), int(row.held))
+            for row in rows
+        }
+
+    def listing_fields(self, showtime_ids: Iterable[int], conn=None) -> Dict[int, Dict[str, Any]]:
+        """seats_available / seats_total / selling_fast for showtime listings, in one query"""
+        fields = {}
+        for showtime_id, counts in self.get_many(showtime_ids, conn).items():
+            total, available = counts['capacity'], counts['available']
+            fields[showtime_id] = {
+                'seats_available': available,
+                'seats_total': total,
+                'selling_fast': 0 < available <= total * self.selling_fast_ratio
+            }
+        return fields
+
+    @staticmethod
+    def _stored(conn, showtime_filter) -> SlotCounts:
+        query = select(
+            ShowtimeSeatCounts.showtime_id, ShowtimeSeatCounts.slot,
+            ShowtimeSeatCounts.capacity, ShowtimeSeatCounts.sold, ShowtimeSeatCounts.held
+        ).where(ShowtimeSeatCounts.showtime_id.in_(showtime_filter))
+        return {(row.showtime_id, row.slot): [row.capacity, row.sold, row.held] for row in conn.execute(query)}
+
+    @staticmethod
+    def _actual(conn, showtime_filter) -> SlotCounts:
+        """Counts recomputed from seats, tickets and seat_locks"""
+        counts: SlotCounts = {}
+        capacity_slot = (Seats.seat_id % COUNTER_SLOTS).label('slot')
+        for column, query in (
+            (0, select(Showtimes.showtime_id, capacity_slot, func.count())
+                .join(Seats, Seats.screen_id == Showtimes.screen_id)
+                .where(Showtimes.showtime_id.in_(showtime_filter))
+                .group_by(Showtimes.showtime_id, capacity_slot)),
+            (1, select(Reservations.showtime_id, (Tickets.seat_id % COUNTER_SLOTS).label('slot'), func.count())
+                .join(Reservations, Reservations.reservation_id == Tickets.reservation_id)
+                .where(Reservations.showtime_id.in_(showtime_filter))
+                .group_by(Reservations.showtime_id, 'slot')),
+            (2, select(SeatLocks.showtime_id, (SeatLocks.seat_id % COUNTER_SLOTS).label('slot'), func.count())
+                .where(SeatLocks.showtime_id.in_(showtime_filter))
+                .group_by(SeatLocks.showtime_id, 'slot')),
+        ):
+            for showtime_id, slot, count in conn.execute(query):
+                counts.setdefault((showtime_id, slot), [0, 0, 0])[column] = count
+        return counts
+
+    @staticmethod
+    def _drifted(stored: SlotCounts, actual: SlotCounts) -> List[int]:
+        return sorted({
+            showtime_id
+            for showtime_id, slot in stored.keys() | actual.keys()
+            if stored.get((showtime_id, slot), [0, 0, 0]) != actual.get((showtime_id, slot), [0, 0, 0])
+        })
+
+    def reconcile(self, repair: bool = True, include_past: bool = False) -> List[Dict[str, Any]]:
+        """Compare counters with the source tables; returns the showtimes that drifted.
+
+        Only showtimes that have not ended are checked unless include_past is
+        set. With repair, each drifted showtime is rewritten in a transaction
+        that holds its counter rows locked, so trigger updates made meanwhile
+        are not lost.
+        """
+        started = time.perf_counter()
+        showtime_filter = select(Showtimes.showtime_id)
+        if not include_past:
+            # end_time is local wall-clock time, like the views' NOW()
+            showtime_filter = showtime_filter.where(Showtimes.end_time > datetime.now())
+
+        with self._db.engine.connect() as conn:
+            stored = self._stored(conn, showtime_filter)
+            actual = self._actual(conn, showtime_filter)
+        drifted = self._drifted(stored, actual)
+
+        report = []
+        for showtime_id in list(drifted):
+            if repair:
+                repaired = self._repair(showtime_id)
+                if repaired is None:
+                    # In-flight writes had not been counted yet when we compared
+                    drifted.remove(showtime_id)
+                    continue
+                stored_totals, actual_totals = repaired
+            else:
+                stored_totals, actual_totals = self._totals(stored, showtime_id), self._totals(actual, showtime_id)
+            report.append({
+                'showtime_id': showtime_id,
+                'stored': availability(*stored_totals),
+                'actual': availability(*actual_totals)
+            })
+
+        metrics.gauge('capacity.drift', len(drifted))
+        if repair:
+            metrics.incr('capacity.repaired', len(drifted))
+        metrics.observe('capacity.reconcile', time.perf_counter() - started)
+        if drifted:
+            logger.warning(f"Seat counts drifted for {len(drifted)} showtimes: {drifted[:20]}")
+        return report
+
+    @staticmethod
+    def _totals(counts: SlotCounts, showtime_id: int) -> Tuple[int, int, int]:
+        totals = [0, 0, 0]
+        for (key_showtime, _), values in counts.items():
+            if key_showtime == showtime_id:
+                totals = [total + value for total, value in zip(totals, values)]
+        return tuple(totals)
+
+    def _repair(self, showtime_id: int) -> Optional[Tuple[Tuple[int, int, int], Tuple[int, int, int]]]:
+        """Rewrite one showtime's counters; returns (stored, actual) totals, None if they agree"""
+        with self._db.engine.begin() as conn:
+            # Lock the counter rows first: triggers of in-flight writes wait for
+            # us, and writes that already counted are committed before we read
+            conn.execute(
+                select(ShowtimeSeatCounts.slot)
+                .where(ShowtimeSeatCounts.showtime_id == showtime_id)
+                .with_for_update()
+            ).all()
+            showtime_filter = [showtime_id]
+            stored = self._stored(conn, showtime_filter)
+            actual = self._actual(conn, showtime_filter)
+            if not self._drifted(stored, actual):
+                return None
+            for key in stored.keys() | actual.keys():
+                capacity, sold, held = actual.get(key, [0, 0, 0])
+                if key in stored:
+                    if stored[key] != [capacity, sold, held]:
+                        conn.execute(
+                            update(ShowtimeSeatCounts)
+                            .where(ShowtimeSeatCounts.showtime_id == key[0], ShowtimeSeatCounts.slot == key[1])
+                            .values(capacity=capacity, sold=sold, held=held)
+                        )
+                else:
+                    conn.execute(insert(ShowtimeSeatCounts).values(
+                        showtime_id=key[0], slot=key[1], capacity=capacity, sold=sold, held=held
+                    ))
+        return self._totals(stored, showtime_id), self._totals(actual, showtime_id)
+
+
+capacity_counters = CapacityCounters()
@@ -0,0 +1,118 @@
+"""
+Response cache for the public movie catalog.
+
+The catalog changes a few times a day but is read on every page load, so the
+encoded JSON body of each catalog response is kept in memory together with a
+gzip-compressed copy and an ETag. A cached read builds no query and serializes
+nothing: the stored bytes are written out as they are, compressed if the
+client accepts gzip, or as a 304 if the client already has them.
+
+Every code path that writes movies calls ``invalidate()`` after its commit. A
+build that was running while an invalidation happened is not stored, so a
+response read before the write cannot be cached after it. Writes made by other
+processes or directly in the database are picked up after
+CATALOG_CACHE_MAX_AGE seconds.
+"""
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple
+
+from flask import make_response, request
+
+from metrics import metrics
+
+# Bodies shorter than this are not worth compressing
+MIN_GZIP_SIZE = 1024
+
+
+class CachedResponse:
+    """Encoded body, its gzip variant and entity tag"""
+
+    __slots__ = ('body', 'gzipped', 'etag', 'status', 'mimetype', 'headers', 'built_at')
+
+    def __init__(self, body: bytes, status: int, mimetype: str, headers: Tuple[Tuple[str, str], ...] = ()):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6) if len(body) >= MIN_GZIP_SIZE else None
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.status = status
+        self.mimetype = mimetype
+        self.headers = headers
+        self.built_at = time.monotonic()
+
+
+class CatalogCache:
+    """Per-process LRU of encoded catalog responses keyed by request variant"""
+
+    def __init__(self):
+        self._entries: 'OrderedDict[Hashable, CachedResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; builds started under an older one are discarded
+        self._generation = 0
+        self.max_age = 300.0
+        self.max_entries = 256
+
+    def init_app(self, app):
+        self.max_age = float(app.config.get('CATALOG_CACHE_MAX_AGE', 300))
+        self.max_entries = int(app.config.get('CATALOG_CACHE_MAX_ENTRIES', 256))
+
+    def invalidate(self):
+        """Drop every cached catalog response; call after committing a movie write"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+        metrics.incr('catalog_cache.invalidations')
+
+    def get(self, key: Hashable, build: Callable) -> CachedResponse:
+        """Cached response for key, or build() it (a Flask response) and keep it"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.built_at < self.max_age:
+                self._entries.move_to_end(key)
+                metrics.incr('catalog_cache.hits')
+                return entry
+            generation = self._generation
+
+        metrics.incr('catalog_cache.misses')
+        response = make_response(build())
+        entry = CachedResponse(
+            response.get_data(), response.status_code, response.mimetype,
+            tuple((name, value) for name, value in response.headers.items()
+                  if name not in ('Content-Type', 'Content-Length'))
+        )
+        if response.status_code == 200:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return entry
+
+    def respond(self, entry: CachedResponse):
+        """Flask response for a cached entry, honouring If-None-Match and Accept-Encoding"""
+        if entry.status == 200 and request.if_none_match.contains(entry.etag):
+            response = make_response('', 304)
+        elif entry.gzipped is not None and 'gzip' in request.accept_encodings:
+            response = make_response(entry.gzipped, entry.status)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = make_response(entry.body, entry.status)
+        if response.status_code != 304:
+            response.mimetype = entry.mimetype
+            for name, value in entry.headers:
+                response.headers[name] = value
+        if entry.status == 200:
+            response.set_etag(entry.etag)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+catalog_cache = CatalogCache()
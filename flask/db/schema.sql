@@ -137,6 +137,59 @@ CREATE TABLE seat_locks (
     CONSTRAINT chk_lock_expiry_after_lock CHECK (expires_at > locked_at)
 );
 
+-- 10. Sold seats (one row per ticketed seat; the primary key makes a
+--     double sale impossible, whichever booking path inserts the ticket)
+CREATE TABLE sold_seats (
+    showtime_id INT NOT NULL,
+    seat_id INT NOT NULL,
+    ticket_id INT NOT NULL,
+    PRIMARY KEY (showtime_id, seat_id),
+    UNIQUE KEY uk_sold_ticket (ticket_id),
+    CONSTRAINT fk_sold_showtime
+        FOREIGN KEY (showtime_id) REFERENCES showtimes (showtime_id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    CONSTRAINT fk_sold_seat
+        FOREIGN KEY (seat_id) REFERENCES seats (seat_id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    CONSTRAINT fk_sold_ticket
+        FOREIGN KEY (ticket_id) REFERENCES tickets (ticket_id)
+        ON UPDATE CASCADE ON DELETE CASCADE
+);
+
+-- 11. Ticket prices (price matrix: seat class x screen format)
+CREATE TABLE ticket_prices (
+    seat_class ENUM('standard', 'premium') NOT NULL,
+    screen_format ENUM('2D', '3D', 'IMAX') NOT NULL,
+    price DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (seat_class, screen_format),
+    CONSTRAINT chk_ticket_price_positive CHECK (price > 0)
+);
+
+-- Reference prices, read by the API's pricing engine (which passes them to sp_create_reservation)
+INSERT INTO ticket_prices (seat_class, screen_format, price) VALUES
+    ('standard', '2D', 8.00),
+    ('standard', '3D', 10.00),
+    ('standard', 'IMAX', 12.00),
+    ('premium', '2D', 16.00),
+    ('premium', '3D', 20.00),
+    ('premium', 'IMAX', 24.00);
+
+-- 12. Showtime seat counts (live capacity / sold / held per showtime)
+--     Spread over slots by seat_id % 8 so concurrent bookings of different
+--     seats rarely update the same row; a showtime's figures are the SUM over
+--     its slots. Kept current by the trg_counts_* triggers below.
+CREATE TABLE showtime_seat_counts (
+    showtime_id INT NOT NULL,
+    slot SMALLINT NOT NULL,
+    capacity INT NOT NULL DEFAULT 0,
+    sold INT NOT NULL DEFAULT 0,
+    held INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (showtime_id, slot),
+    CONSTRAINT fk_counts_showtime
+        FOREIGN KEY (showtime_id) REFERENCES showtimes (showtime_id)
+        ON UPDATE CASCADE ON DELETE CASCADE
+);
+
 -- TRIGGER: Prevent overlapping showtimes on the same screen (INSERT)
 -- Includes 15-minute buffer time between shows for cleaning and audience transition
 DELIMITER //
@@ -273,13 +326,143 @@ BEGIN
 END//
 DELIMITER ;
 
+-- TRIGGER: Claim the seat in sold_seats for every new ticket
+-- A duplicate (showtime, seat) fails the insert, so the seat cannot be sold twice;
+-- deleting the ticket (cancellation, expiry) releases the claim through fk_sold_ticket
+DELIMITER //
+CREATE TRIGGER trg_ticket_claim_seat
+AFTER INSERT ON tickets
+FOR EACH ROW
+BEGIN
+    INSERT INTO sold_seats (showtime_id, seat_id, ticket_id)
+    SELECT r.showtime_id, NEW.seat_id, NEW.ticket_id
+      FROM reservations r
+     WHERE r.reservation_id = NEW.reservation_id;
+END//
+DELIMITER ;
+
+-- TRIGGER: Start the seat counts of a new showtime from its screen's seats
+DELIMITER //
+CREATE TRIGGER trg_counts_showtime_insert
+AFTER INSERT ON showtimes
+FOR EACH ROW
+BEGIN
+    INSERT INTO showtime_seat_counts (showtime_id, slot, capacity)
+    SELECT NEW.showtime_id, s.seat_id % 8, COUNT(*)
+      FROM seats s
+     WHERE s.screen_id = NEW.screen_id
+     GROUP BY s.seat_id % 8;
+END//
+DELIMITER ;
+
+-- TRIGGER: Recompute capacity when a showtime moves to another screen
+DELIMITER //
+CREATE TRIGGER trg_counts_showtime_update
+AFTER UPDATE ON showtimes
+FOR EACH ROW
+BEGIN
+    IF NEW.screen_id <> OLD.screen_id THEN
+        UPDATE showtime_seat_counts SET capacity = 0 WHERE showtime_id = NEW.showtime_id;
+        INSERT INTO showtime_seat_counts (showtime_id, slot, capacity)
+        SELECT NEW.showtime_id, s.seat_id % 8, COUNT(*)
+          FROM seats s
+         WHERE s.screen_id = NEW.screen_id
+         GROUP BY s.seat_id % 8
+        ON DUPLICATE KEY UPDATE capacity = VALUES(capacity);
+    END IF;
+END//
+DELIMITER ;
+
+-- TRIGGER: A seat added to a screen adds capacity to its showtimes
+DELIMITER //
+CREATE TRIGGER trg_counts_seat_insert
+AFTER INSERT ON seats
+FOR EACH ROW
+BEGIN
+    INSERT INTO showtime_seat_counts (showtime_id, slot, capacity)
+    SELECT st.showtime_id, NEW.seat_id % 8, 1
+      FROM showtimes st
+     WHERE st.screen_id = NEW.screen_id
+    ON DUPLICATE KEY UPDATE capacity = capacity + 1;
+END//
+DELIMITER ;
+
+-- TRIGGER: A seat removed from a screen takes capacity from its showtimes
+DELIMITER //
+CREATE TRIGGER trg_counts_seat_delete
+AFTER DELETE ON seats
+FOR EACH ROW
+BEGIN
+    UPDATE showtime_seat_counts c
+      JOIN showtimes st ON st.showtime_id = c.showtime_id
+       SET c.capacity = c.capacity - 1
+     WHERE st.screen_id = OLD.screen_id
+       AND c.slot = OLD.seat_id % 8;
+END//
+DELIMITER ;
+
+-- TRIGGER: Count a sold seat
+DELIMITER //
+CREATE TRIGGER trg_counts_ticket_insert
+AFTER INSERT ON tickets
+FOR EACH ROW
+BEGIN
+    UPDATE showtime_seat_counts c
+      JOIN reservations r ON r.showtime_id = c.showtime_id
+       SET c.sold = c.sold + 1
+     WHERE r.reservation_id = NEW.reservation_id
+       AND c.slot = NEW.seat_id % 8;
+END//
+DELIMITER ;
+
+-- TRIGGER: Uncount a sold seat (cancellation, expiry)
+DELIMITER //
+CREATE TRIGGER trg_counts_ticket_delete
+AFTER DELETE ON tickets
+FOR EACH ROW
+BEGIN
+    UPDATE showtime_seat_counts c
+      JOIN reservations r ON r.showtime_id = c.showtime_id
+       SET c.sold = c.sold - 1
+     WHERE r.reservation_id = OLD.reservation_id
+       AND c.slot = OLD.seat_id % 8;
+END//
+DELIMITER ;
+
+-- TRIGGER: Count a held seat (taking over an expired lock is an update, not counted twice)
+DELIMITER //
+CREATE TRIGGER trg_counts_lock_insert
+AFTER INSERT ON seat_locks
+FOR EACH ROW
+BEGIN
+    UPDATE showtime_seat_counts
+       SET held = held + 1
+     WHERE showtime_id = NEW.showtime_id
+       AND slot = NEW.seat_id % 8;
+END//
+DELIMITER ;
+
+-- TRIGGER: Uncount a held seat (unlock, booking, expiry reaper)
+DELIMITER //
+CREATE TRIGGER trg_counts_lock_delete
+AFTER DELETE ON seat_locks
+FOR EACH ROW
+BEGIN
+    UPDATE showtime_seat_counts
+       SET held = held - 1
+     WHERE showtime_id = OLD.showtime_id
+       AND slot = OLD.seat_id % 8;
+END//
+DELIMITER ;
+
 -- PROCEDURE: Create a reservation
 DELIMITER //
 
 CREATE PROCEDURE sp_create_reservation (
     IN p_user_id INT,
     IN p_showtime_id INT,
-    IN p_seat_ids JSON
+    IN p_seat_ids JSON,
+    IN p_prices JSON
 )
 BEGIN
     DECLARE v_reservation_id INT;
@@ -310,8 +493,9 @@ BEGIN
           SET MESSAGE_TEXT = 'Showtime not found';
     END IF;
 
-    /* Lock the specific seats we're trying to reserve */
-    SELECT s.seat_id
+    /* Lock the specific seats we're trying to reserve
+       (INTO, so the caller only receives the result sets of step 7) */
+    SELECT COUNT(*) INTO v_cnt
       FROM seats s
       WHERE s.seat_id IN (
           SELECT seat_id FROM JSON_TABLE(p_seat_ids, '$[*]' COLUMNS (seat_id INT PATH '$')) AS jt
@@ -358,6 +542,19 @@ BEGIN
           SET MESSAGE_TEXT = 'Seat currently locked by another user';
     END IF;
 
+    /* 2d – every seat class has a price for this format in p_prices,
+       the API's price matrix {seat_class: {screen_format: price}}, so
+       tickets are charged exactly what the API quotes */
+    SELECT COUNT(*) INTO v_cnt
+      FROM seats s
+      JOIN JSON_TABLE(p_seat_ids, '$[*]' COLUMNS (seat_id INT PATH '$')) j6
+        ON j6.seat_id = s.seat_id
+     WHERE JSON_EXTRACT(p_prices, CONCAT('$.', s.seat_class, '."', v_format, '"')) IS NULL;
+    IF v_cnt > 0 THEN
+        SIGNAL SQLSTATE '45000'
+          SET MESSAGE_TEXT = 'No ticket price for one or more seats';
+    END IF;
+
     /* --------- 3. Insert the reservation (15-minute expiry) */
     INSERT INTO reservations
           (user_id, showtime_id, status, created_at, expires_at)
@@ -366,20 +563,12 @@ BEGIN
 
     SET v_reservation_id = LAST_INSERT_ID();
 
-    /* --------- 4. Insert tickets and calculate price inline */
+    /* --------- 4. Insert tickets priced from p_prices */
     INSERT INTO tickets (reservation_id, seat_id, price)
     SELECT v_reservation_id,
            s.seat_id,
-           /* base price by seat-class … */
-           (CASE s.seat_class
-                WHEN 'standard' THEN 8.00
-                WHEN 'premium' THEN 16.00 END)
-           *
-           /* … times multiplier by screen format */
-           (CASE v_format
-                WHEN '2D' THEN 1.00
-                WHEN '3D' THEN 1.25
-                WHEN 'IMAX' THEN 1.50 END) AS price
+           CAST(JSON_UNQUOTE(JSON_EXTRACT(p_prices, CONCAT('$.', s.seat_class, '."', v_format, '"')))
+                AS DECIMAL(10,2))
       FROM seats s
       JOIN JSON_TABLE(p_seat_ids, '$[*]' COLUMNS (seat_id INT PATH '$')) j4
         ON j4.seat_id = s.seat_id;
@@ -396,6 +585,17 @@ BEGIN
        AND seat_id IN (SELECT seat_id
                          FROM JSON_TABLE(p_seat_ids,'$[*]' COLUMNS (seat_id INT PATH '$')) AS j5);
 
+    /* --------- 7. Return the new reservation and its tickets */
+    SELECT reservation_id, user_id, showtime_id, status, created_at, expires_at
+      FROM reservations
+     WHERE reservation_id = v_reservation_id;
+
+    SELECT t.ticket_id, t.reservation_id, t.seat_id, s.seat_label, t.price, t.issued_at
+      FROM tickets t
+      JOIN seats s ON s.seat_id = t.seat_id
+     WHERE t.reservation_id = v_reservation_id
+     ORDER BY t.ticket_id;
+
     COMMIT;
 END//
 DELIMITER ;
@@ -596,16 +796,24 @@ LEFT JOIN (
         SUM(t.price) AS total_revenue,
         AVG(t.price) AS avg_ticket_price,
         SUM(t.price) / COUNT(DISTINCT st.showtime_id) AS avg_revenue_per_showtime,
-        (COUNT(t.ticket_id) / (COUNT(DISTINCT st.showtime_id) * 96.0)) * 100 AS avg_occupancy_rate,
+        (COUNT(t.ticket_id) / NULLIF(MAX(cap.total_capacity), 0)) * 100 AS avg_occupancy_rate,
         
         -- Ranking components (higher is better)
         PERCENT_RANK() OVER (ORDER BY SUM(t.price)) * 100 AS revenue_rank,
-        PERCENT_RANK() OVER (ORDER BY (COUNT(t.ticket_id) / (COUNT(DISTINCT st.showtime_id) * 96.0))) * 100 AS occupancy_rank,
+        PERCENT_RANK() OVER (ORDER BY (COUNT(t.ticket_id) / NULLIF(MAX(cap.total_capacity), 0))) * 100 AS occupancy_rank,
         PERCENT_RANK() OVER (ORDER BY COUNT(t.ticket_id)) * 100 AS volume_rank
         
     FROM showtimes st
     LEFT JOIN reservations r ON r.showtime_id = st.showtime_id AND r.status = 'confirmed'  
     LEFT JOIN tickets t ON t.reservation_id = r.reservation_id
+    -- Seats offered by the movie's showtimes in the same window (real screen sizes)
+    LEFT JOIN (
+        SELECT st2.movie_id, SUM(c.capacity) AS total_capacity
+        FROM showtimes st2
+        JOIN showtime_seat_counts c ON c.showtime_id = st2.showtime_id
+        WHERE st2.start_time >= DATE_SUB(NOW(), INTERVAL 90 DAY)
+        GROUP BY st2.movie_id
+    ) cap ON cap.movie_id = st.movie_id
     WHERE st.start_time >= DATE_SUB(NOW(), INTERVAL 90 DAY)  -- Last 90 days
     GROUP BY st.movie_id
 ) perf ON perf.movie_id = m.movie_id
@@ -663,6 +871,9 @@ CREATE INDEX idx_showtimes_screen_end ON showtimes(screen_id, end_time);
 CREATE INDEX idx_reservations_created_at ON reservations(created_at);
 CREATE INDEX idx_reservations_expires_at ON reservations(expires_at);
 
+-- Reservations: A user's booking history, newest first (keyset pagination)
+CREATE INDEX idx_reservations_user_created ON reservations(user_id, created_at);
+
 -- Seat locks: Cleanup of expired locks
 CREATE INDEX idx_seat_locks_expires_at ON seat_locks(expires_at);
 
@@ -703,6 +914,9 @@ CREATE INDEX idx_seat_locks_user_id ON seat_locks(user_id);
 -- Movies: Genre-based filtering
 CREATE INDEX idx_movies_genre ON movies(genre);
 
+-- Cinemas: Showtime search by city
+CREATE INDEX idx_cinemas_city ON cinemas(city);
+
 -- Seats: Class-based queries and pricing
 CREATE INDEX idx_seats_seat_class ON seats(seat_class);
 
@@ -81,7 +81,7 @@ class DatabaseSeeder:
             
             expected_tables = [
                 'users', 'cinemas', 'screens', 'seats', 'movies', 
-                'showtimes', 'reservations', 'tickets', 'seat_locks'
+                'showtimes', 'reservations', 'tickets', 'seat_locks', 'sold_seats', 'ticket_prices', 'showtime_seat_counts'
             ]
             
             missing_tables = [table for table in expected_tables if table not in tables]
@@ -168,6 +168,7 @@ class DatabaseSeeder:
             ("users", "SELECT COUNT(*) FROM users", 0, "users"),
             ("movies", "SELECT COUNT(*) FROM movies", 6, "movies"),
             ("showtimes", "SELECT COUNT(*) FROM showtimes", 129, "showtimes"),
+            ("ticket_prices", "SELECT COUNT(*) FROM ticket_prices", 6, "ticket prices"),
         ]
         
         validation_passed = True
@@ -12,6 +12,15 @@ TRUNCATE TABLE users;
 
 SET FOREIGN_KEY_CHECKS = 1;
 
+-- Reference ticket prices (same as schema.sql); prices already set are kept
+INSERT IGNORE INTO ticket_prices (seat_class, screen_format, price) VALUES
+    ('standard', '2D', 8.00),
+    ('standard', '3D', 10.00),
+    ('standard', 'IMAX', 12.00),
+    ('premium', '2D', 16.00),
+    ('premium', '3D', 20.00),
+    ('premium', 'IMAX', 24.00);
+
 INSERT INTO cinemas (name, address, city) VALUES
 ('VinUni Cinema', '123 Nguyen Van Cu Street, Gia Lam District', 'Hanoi'),
 ('Downtown Multiplex', '456 Tran Hung Dao Street, Hoan Kiem District', 'Hanoi'),
@@ -0,0 +1,199 @@
+"""
+Background expiry of seat locks and pending reservations.
+
+A single daemon thread sleeps until the earliest known deadline instead of
+polling on a fixed interval. Deadlines come from the database (MIN over the
+indexed ``expires_at`` columns) and from hints given by the lock routes when
+they create a lock, so a new earlier deadline wakes the thread immediately.
+Expired rows are removed in bounded batches, each in its own short transaction.
+Seats freed by expired reservations are reported to the seat state engine
+once their batch has committed, so seat maps and change streams show them
+available straight away.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+
+from metrics import metrics
+from seat_state import seat_state_engine
+
+logger = logging.getLogger(__name__)
+
+NO_DEADLINE = datetime.max
+
+
+class ExpiryReaper:
+    """Next-deadline scheduler that deletes expired locks and expires reservations"""
+
+    def __init__(self):
+        self._app = None
+        self._db = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Condition()
+        self._next_deadline = NO_DEADLINE
+        self._stopping = False
+        self.batch_size = 500
+        self.max_idle = 60.0
+        self.retry_delay = 1.0
+
+    def init_app(self, app, db):
+        self._app = app
+        self._db = db
+        self.batch_size = int(app.config.get('EXPIRY_REAPER_BATCH_SIZE', 500))
+        # Upper bound on sleep, so deadlines created by other processes are found
+        self.max_idle = float(app.config.get('EXPIRY_REAPER_MAX_IDLE', 60))
+        # Pause before sweeping again when rows are still due right after a sweep
+        self.retry_delay = float(app.config.get('EXPIRY_REAPER_RETRY_DELAY', 1))
+        if app.config.get('EXPIRY_REAPER_ENABLED', True):
+            self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='expiry-reaper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+
+    def schedule(self, deadline: datetime):
+        """Hint that something expires at ``deadline``; wakes the thread if earlier"""
+        with self._wakeup:
+            if deadline < self._next_deadline:
+                self._next_deadline = deadline
+                self._wakeup.notify()
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                try:
+                    self.sweep()
+                    next_deadline = self._earliest_deadline()
+                except Exception as e:
+                    logger.error(f"Expiry sweep failed: {str(e)}")
+                    metrics.incr('expiry.errors')
+                    next_deadline = NO_DEADLINE
+
+                # Still due right after a sweep: the rows are held by another
+                # transaction (skipped by SKIP LOCKED), so don't spin on them
+                now = datetime.utcnow()
+                not_before = now + timedelta(seconds=self.retry_delay) if next_deadline <= now else now
+
+                with self._wakeup:
+                    self._next_deadline = min(self._next_deadline, next_deadline)
+                    while not self._stopping:
+                        now = datetime.utcnow()
+                        wake_at = max(self._next_deadline, not_before)
+                        if wake_at <= now:
+                            break
+                        wait = min(self.max_idle, (wake_at - now).total_seconds())
+                        if not self._wakeup.wait(timeout=wait):
+                            # Timed out: either the deadline arrived or max_idle passed
+                            break
+                    if self._stopping:
+                        return
+                    self._next_deadline = NO_DEADLINE
+
+    def _earliest_deadline(self) -> datetime:
+        """Earliest pending expiry, answered from the expires_at indexes"""
+        with self._db.engine.connect() as conn:
+            row = conn.execute(text("""
+                SELECT
+                    (SELECT MIN(expires_at) FROM seat_locks) AS next_lock,
+                    (SELECT MIN(expires_at) FROM reservations WHERE status = 'pending') AS next_reservation
+            """)).first()
+        deadlines = [deadline for deadline in (row.next_lock, row.next_reservation) if deadline is not None]
+        return min(deadlines) if deadlines else NO_DEADLINE
+
+    def sweep(self):
+        """Remove everything that has expired, one bounded batch at a time"""
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        oldest = self._oldest_due(now)
+        if oldest is not None:
+            metrics.gauge('expiry.lag_seconds', (now - oldest).total_seconds())
+        else:
+            metrics.gauge('expiry.lag_seconds', 0.0)
+
+        locks_deleted = 0
+        while True:
+            with self._db.engine.begin() as conn:
+                deleted = conn.execute(
+                    text("""
+                        DELETE FROM seat_locks
+                        WHERE expires_at <= :now
+                        ORDER BY expires_at
+                        LIMIT :batch
+                    """),
+                    {'now': now, 'batch': self.batch_size}
+                ).rowcount
+            locks_deleted += deleted
+            if deleted < self.batch_size:
+                break
+
+        reservations_expired = 0
+        while True:
+            # showtime_id -> seats freed by this batch
+            freed: Dict[int, List[int]] = {}
+            with self._db.engine.begin() as conn:
+                reservation_ids = conn.execute(
+                    text("""
+                        SELECT reservation_id
+                        FROM reservations
+                        WHERE expires_at <= :now AND status = 'pending'
+                        ORDER BY expires_at
+                        LIMIT :batch
+                        FOR UPDATE SKIP LOCKED
+                    """),
+                    {'now': now, 'batch': self.batch_size}
+                ).scalars().all()
+                if reservation_ids:
+                    params = {'ids': list(reservation_ids)}
+                    conn.execute(
+                        text("UPDATE reservations SET status = 'expired' WHERE reservation_id IN :ids")
+                        .bindparams(bindparam('ids', expanding=True)),
+                        params
+                    )
+                    for showtime_id, seat_id in conn.execute(
+                        text("""
+                            SELECT r.showtime_id, t.seat_id
+                            FROM tickets t
+                            JOIN reservations r ON r.reservation_id = t.reservation_id
+                            WHERE t.reservation_id IN :ids
+                        """).bindparams(bindparam('ids', expanding=True)),
+                        params
+                    ):
+                        freed.setdefault(showtime_id, []).append(seat_id)
+                    # Free the seats, as sp_cancel_reservation does for cancellations
+                    conn.execute(
+                        text("DELETE FROM tickets WHERE reservation_id IN :ids")
+                        .bindparams(bindparam('ids', expanding=True)),
+                        params
+                    )
+            for showtime_id, seat_ids in freed.items():
+                seat_state_engine.apply_expired(showtime_id, seat_ids)
+            reservations_expired += len(reservation_ids)
+            if len(reservation_ids) < self.batch_size:
+                break
+
+        metrics.incr('expiry.sweeps')
+        metrics.incr('expiry.seat_locks_deleted', locks_deleted)
+        metrics.incr('expiry.reservations_expired', reservations_expired)
+        metrics.observe('expiry.sweep', time.perf_counter() - started)
+        if locks_deleted or reservations_expired:
+            logger.info(f"Expired {locks_deleted} seat locks and {reservations_expired} reservations")
+        return locks_deleted, reservations_expired
+
+    def _oldest_due(self, now: datetime) -> Optional[datetime]:
+        deadline = self._earliest_deadline()
+        return deadline if deadline <= now else None
+
+
+expiry_reaper = ExpiryReaper()
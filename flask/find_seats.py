@@ -1,6 +1,7 @@
 from app import create_app
 from models import Showtimes, Seats  # Updated to DDL-first models
 from extensions import db
+from layout_cache import layout_cache
 
 app = create_app()
 
@@ -13,10 +14,11 @@ with app.app_context():
         print(f"End time: {showtime.end_time}")
         
         # Find all seats for this screen
-        seats = Seats.query.filter_by(screen_id=showtime.screen_id).all()
-        print(f"\nFound {len(seats)} seats for this screen:")
+        layout = layout_cache.get(showtime.screen_id)
+        print(f"\nFound {len(layout)} seats for this screen:")
         
-        for seat in seats:
-            print(f"  Seat {seat.seat_label}: Row {seat.row_num}, Col {seat.col_num}, Class: {seat.seat_class}")
+        for position in range(len(layout)):
+            print(f"  Seat {layout.labels[position]}: Row {layout.rows[position]}, "
+                  f"Col {layout.cols[position]}, Class: {layout.seat_class(position)}")
     else:
         print("No showtimes found in the database.") 
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Idempotency keys for retried POST requests.
+
+A client sends the same ``Idempotency-Key`` header on every retry of one
+logical request. The first request runs the view; its response is kept for
+IDEMPOTENCY_TTL seconds and replayed to any retry without touching the
+database. A retry that arrives while the first request is still running waits
+for it instead of racing it. Reusing a key for a different request body is
+rejected with 422.
+
+Responses with a 5xx status are not kept, so a failed attempt can be retried.
+Neither are responses that tell the client to come back later (a booking shed
+by admission control, a conflict with another request): the key is released,
+so a retry with the same key runs the request again. The store is per process.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import jsonify, make_response, request
+
+from metrics import metrics
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# "Retry later" answers: the retry must run the request again, not replay them
+RETRY_LATER_STATUSES = frozenset({409, 429, 503})
+
+
+class _Entry:
+    """One key: in flight until ``done`` is set, then a cached response"""
+
+    __slots__ = ('fingerprint', 'done', 'response', 'expires_at')
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        # (status, body, mimetype) once completed
+        self.response: Optional[Tuple[int, bytes, str]] = None
+        self.expires_at = float('inf')
+
+
+class IdempotencyStore:
+    """Expiring key -> response map with in-flight deduplication"""
+
+    def __init__(self):
+        self._entries: 'OrderedDict[Tuple[str, str], _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.ttl = 3600.0
+        self.wait_timeout = 30.0
+        self.max_entries = 10000
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get('IDEMPOTENCY_TTL', 3600))
+        self.wait_timeout = float(app.config.get('IDEMPOTENCY_WAIT_TIMEOUT', 30))
+        self.max_entries = int(app.config.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+
+    def begin(self, scope: str, key: str, fingerprint: str) -> Tuple[bool, _Entry]:
+        """Claim a key; returns (True, entry) if the caller must run the request"""
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get((scope, key))
+            if entry is not None and entry.expires_at > now:
+                return False, entry
+            entry = _Entry(fingerprint)
+            self._entries.pop((scope, key), None)
+            self._entries[(scope, key)] = entry
+            return True, entry
+
+    def finish(self, scope: str, key: str, entry: _Entry, response: Optional[Tuple[int, bytes, str]]):
+        """Publish the outcome; None drops the key so it can be retried"""
+        with self._lock:
+            if response is None:
+                if self._entries.get((scope, key)) is entry:
+                    del self._entries[(scope, key)]
+            else:
+                entry.response = response
+                entry.expires_at = time.monotonic() + self.ttl
+                if self._entries.get((scope, key)) is entry:
+                    self._entries.move_to_end((scope, key))
+        entry.done.set()
+
+    def _purge(self, now: float):
+        """Drop expired entries, oldest first, and the oldest beyond max_entries.
+
+        Completed entries are kept in completion order, which with a fixed TTL
+        is also expiry order, so only the front of the map is examined.
+        """
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            if not entry.done.is_set():
+                break
+            del self._entries[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _fingerprint() -> str:
+    digest = hashlib.sha256(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _replay(entry: _Entry):
+    status, body, mimetype = entry.response
+    response = make_response(body, status)
+    response.mimetype = mimetype
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Make a POST view replay its first response for a repeated Idempotency-Key"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        scope = request.path
+        fingerprint = _fingerprint()
+        while True:
+            owner, entry = idempotency_store.begin(scope, key, fingerprint)
+            if owner:
+                break
+            if entry.fingerprint != fingerprint:
+                return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+            if not entry.done.wait(idempotency_store.wait_timeout):
+                metrics.incr('idempotency.in_progress')
+                return jsonify({'error': f'A request with this {HEADER} is still in progress'}), 409
+            if entry.response is not None:
+                metrics.incr('idempotency.replayed')
+                return _replay(entry)
+            # The first attempt failed and released the key: run it again
+
+        cached = None
+        try:
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code < 500 and response.status_code not in RETRY_LATER_STATUSES
+                    and not response.is_streamed):
+                cached = (response.status_code, response.get_data(), response.mimetype)
+            return response
+        finally:
+            idempotency_store.finish(scope, key, entry, cached)
+
+    return wrapper
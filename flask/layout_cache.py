@@ -0,0 +1,145 @@
+"""
+Screen-layout cache.
+
+Seats for a screen are effectively static, so each screen's layout is loaded
+once and kept as a struct-of-arrays (seat ids, labels, rows, columns, classes)
+ordered by row and column. A layout is only dropped when seats for its screen
+are written through the ORM.
+"""
+import hashlib
+import threading
+from array import array
+from typing import Any, Dict, List
+
+from sqlalchemy import event, select
+from sqlalchemy.orm.attributes import get_history
+
+from models import Seats
+
+SEAT_CLASSES = ('standard', 'premium')
+
+
+class ScreenLayout:
+    """Immutable seat layout of a single screen"""
+
+    __slots__ = ('screen_id', 'seat_ids', 'labels', 'rows', 'cols', 'classes',
+                 'index', 'stale', '_records', '_grid', '_fingerprint')
+
+    def __init__(self, screen_id: int, seats: List[tuple]):
+        self.screen_id = screen_id
+        # seats: (seat_id, seat_class, seat_label, row_num, col_num) ordered by row, col
+        self.seat_ids = array('i', (seat[0] for seat in seats))
+        self.classes = bytes(SEAT_CLASSES.index(seat[1]) for seat in seats)
+        self.labels = tuple(seat[2] for seat in seats)
+        self.rows = array('h', (seat[3] for seat in seats))
+        self.cols = array('h', (seat[4] for seat in seats))
+        self.index = {seat_id: position for position, seat_id in enumerate(self.seat_ids)}
+        self.stale = False
+        self._records = None
+        self._grid = None
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.seat_ids)
+
+    def seat_class(self, position: int) -> str:
+        return SEAT_CLASSES[self.classes[position]]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Seat dicts in ModelSerializer.serialize_seats shape, built once"""
+        if self._records is None:
+            self._records = [
+                {
+                    'seat_id': self.seat_ids[position],
+                    'screen_id': self.screen_id,
+                    'seat_class': SEAT_CLASSES[self.classes[position]],
+                    'seat_label': self.labels[position],
+                    'row_num': self.rows[position],
+                    'col_num': self.cols[position]
+                }
+                for position in range(len(self.seat_ids))
+            ]
+        return self._records
+
+    def grid(self) -> List[tuple]:
+        """Rows as (row_num, start, end): positions start..end-1 hold that row by column"""
+        if self._grid is None:
+            grid = []
+            start = 0
+            for position in range(1, len(self.seat_ids) + 1):
+                if position == len(self.seat_ids) or self.rows[position] != self.rows[start]:
+                    grid.append((self.rows[start], start, position))
+                    start = position
+            self._grid = grid
+        return self._grid
+
+    def fingerprint(self) -> str:
+        """Stable 16-hex-digit hash of the layout's static content"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256(str(self.screen_id).encode())
+            for position in range(len(self.seat_ids)):
+                digest.update(
+                    f'|{self.seat_ids[position]},{self.labels[position]},{self.rows[position]},'
+                    f'{self.cols[position]},{self.classes[position]}'.encode()
+                )
+            self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
+    def with_status(self, statuses: List[str]) -> List[Dict[str, Any]]:
+        """Overlay per-seat status names onto the prebuilt layout"""
+        return [dict(record, status=status) for record, status in zip(self.records(), statuses)]
+
+
+class LayoutCache:
+    """Process-wide cache of ScreenLayout objects keyed by screen_id"""
+
+    def __init__(self):
+        self._db = None
+        self._layouts: Dict[int, ScreenLayout] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        """Bind the cache to the app's database"""
+        self._db = db
+
+    def get(self, screen_id: int, conn=None) -> ScreenLayout:
+        """Return the layout for a screen, loading it on first use"""
+        with self._lock:
+            layout = self._layouts.get(screen_id)
+        if layout is not None:
+            return layout
+
+        query = (
+            select(Seats.seat_id, Seats.seat_class, Seats.seat_label, Seats.row_num, Seats.col_num)
+            .where(Seats.screen_id == screen_id)
+            .order_by(Seats.row_num, Seats.col_num)
+        )
+        if conn is not None:
+            rows = conn.execute(query).all()
+        else:
+            with self._db.engine.connect() as own_conn:
+                rows = own_conn.execute(query).all()
+        layout = ScreenLayout(screen_id, [tuple(row) for row in rows])
+
+        with self._lock:
+            return self._layouts.setdefault(screen_id, layout)
+
+    def invalidate(self, screen_id: int):
+        """Drop a screen's layout; holders of the old object see it as stale"""
+        with self._lock:
+            layout = self._layouts.pop(screen_id, None)
+        if layout is not None:
+            layout.stale = True
+
+
+layout_cache = LayoutCache()
+
+
+@event.listens_for(Seats, 'after_insert')
+@event.listens_for(Seats, 'after_update')
+@event.listens_for(Seats, 'after_delete')
+def _invalidate_screen_layout(mapper, connection, seat):
+    layout_cache.invalidate(seat.screen_id)
+    # A seat moved to another screen also changes the layout it left
+    for screen_id in get_history(seat, 'screen_id').deleted:
+        layout_cache.invalidate(screen_id)
@@ -0,0 +1,64 @@
+"""
+Lightweight in-process metrics.
+
+Counters, gauges and timings kept in memory and exposed through the admin
+metrics endpoint. Values are per process and reset on restart.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+
+
+class Metrics:
+    """Thread-safe registry of named counters, gauges and timings"""
+
+    def __init__(self):
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        # name -> [count, total_seconds, max_seconds]
+        self._timings: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            timing = self._timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Record the duration of a block as a timing"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': {
+                    name: {
+                        'count': count,
+                        'total_seconds': round(total, 6),
+                        'avg_seconds': round(total / count, 6) if count else 0.0,
+                        'max_seconds': round(maximum, 6)
+                    }
+                    for name, (count, total, maximum) in self._timings.items()
+                }
+            }
+
+
+metrics = Metrics()
@@ -207,6 +207,45 @@ class SeatLocks(Base):
     user: Mapped['Users'] = relationship('Users', back_populates='seat_locks')
 
 
+class ShowtimeSeatCounts(Base):
+    __tablename__ = 'showtime_seat_counts'
+    __table_args__ = (
+        ForeignKeyConstraint(['showtime_id'], ['showtimes.showtime_id'], ondelete='CASCADE', onupdate='CASCADE', name='fk_counts_showtime'),
+    )
+
+    showtime_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    slot: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    capacity: Mapped[int] = mapped_column(Integer, server_default=text("'0'"))
+    sold: Mapped[int] = mapped_column(Integer, server_default=text("'0'"))
+    held: Mapped[int] = mapped_column(Integer, server_default=text("'0'"))
+
+
+class SoldSeats(Base):
+    __tablename__ = 'sold_seats'
+    __table_args__ = (
+        ForeignKeyConstraint(['seat_id'], ['seats.seat_id'], ondelete='CASCADE', onupdate='CASCADE', name='fk_sold_seat'),
+        ForeignKeyConstraint(['showtime_id'], ['showtimes.showtime_id'], ondelete='CASCADE', onupdate='CASCADE', name='fk_sold_showtime'),
+        ForeignKeyConstraint(['ticket_id'], ['tickets.ticket_id'], ondelete='CASCADE', onupdate='CASCADE', name='fk_sold_ticket'),
+        Index('fk_sold_seat', 'seat_id'),
+        Index('uk_sold_ticket', 'ticket_id', unique=True)
+    )
+
+    showtime_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seat_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ticket_id: Mapped[int] = mapped_column(Integer)
+
+
+class TicketPrices(Base):
+    __tablename__ = 'ticket_prices'
+    __table_args__ = (
+        CheckConstraint('(`price` > 0)', name='chk_ticket_price_positive'),
+    )
+
+    seat_class: Mapped[str] = mapped_column(ENUM('standard', 'premium'), primary_key=True)
+    screen_format: Mapped[str] = mapped_column(ENUM('2D', '3D', 'IMAX'), primary_key=True)
+    price: Mapped[decimal.Decimal] = mapped_column(DECIMAL(10, 2))
+
+
 class Tickets(Base):
     __tablename__ = 'tickets'
     __table_args__ = (
@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row of a page, encoded as an opaque
+URL-safe token. The next page is the rows strictly after that key in the
+listing's sort order, which an index on the sort columns answers directly,
+however deep the client pages.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Sequence, Tuple
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque token for a sort key; datetimes are kept as ISO strings"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str, types: Sequence[type]) -> Tuple[Any, ...]:
+    """Inverse of encode_cursor; raises ValueError if the token is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise ValueError('Invalid cursor')
+    values = []
+    for value, kind in zip(payload, types):
+        try:
+            values.append(datetime.fromisoformat(value) if kind is datetime else kind(value))
+        except (ValueError, TypeError) as e:
+            raise ValueError('Invalid cursor') from e
+    return tuple(values)
+
+
+def parse_limit(value, default: int = DEFAULT_LIMIT, maximum: int = MAX_LIMIT) -> int:
+    """Page size from a query parameter, clamped to 1..maximum"""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, maximum))
@@ -0,0 +1,130 @@
+"""
+Ticket pricing engine.
+
+Prices come from the ``ticket_prices`` matrix (seat class x screen format).
+The matrix and the format of each screen are loaded once and kept in memory,
+refreshed every PRICING_MAX_AGE seconds, so quotes are answered without a
+database query.
+
+The app verifies at startup that every seat class / screen format has a
+price, so a database without them fails to start instead of failing
+bookings. The ``INSERT IGNORE INTO ticket_prices`` statement of
+``db/seed_data.sql`` adds missing reference prices without overwriting edited
+ones, and can be run on its own against an existing database.
+
+This engine is the only price source of every booking path: group commit and
+optimistic bookings price their tickets with ``price()``, and the procedure
+path passes ``price_matrix()`` to sp_create_reservation, which charges from
+it instead of reading ticket_prices itself. A quote and the charge that
+follows it in the same process therefore always use the same matrix, even
+while a price edit has not been picked up yet.
+"""
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from layout_cache import SEAT_CLASSES, ScreenLayout
+from models import Screens, TicketPrices
+
+
+class PricingError(Exception):
+    """No price is defined for a seat class / screen format combination"""
+
+
+class PricingEngine:
+    """Cached ticket price matrix"""
+
+    def __init__(self):
+        self._db = None
+        self._prices: Dict[Tuple[str, str], Decimal] = {}
+        self._screen_formats: Dict[int, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.max_age = 300.0
+
+    def init_app(self, app, db):
+        self._db = db
+        self.max_age = float(app.config.get('PRICING_MAX_AGE', 300))
+
+    def invalidate(self):
+        """Reload the matrix and screen formats on next use"""
+        with self._lock:
+            self._loaded_at = None
+
+    def verify(self):
+        """Load the matrix now; raises PricingError if any combination has no price"""
+        self.invalidate()
+        prices, _ = self._current()
+        screen_formats = TicketPrices.__table__.c.screen_format.type.enums
+        missing = [f'{seat_class}/{screen_format}'
+                   for seat_class in SEAT_CLASSES for screen_format in screen_formats
+                   if (seat_class, screen_format) not in prices]
+        if missing:
+            raise PricingError(f"ticket_prices has no price for {', '.join(missing)}; add them with "
+                               f"the INSERT IGNORE INTO ticket_prices statement of db/seed_data.sql")
+
+    def _current(self) -> Tuple[Dict[Tuple[str, str], Decimal], Dict[int, str]]:
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return self._prices, self._screen_formats
+        with self._db.engine.connect() as conn:
+            prices = {
+                (row.seat_class, row.screen_format): row.price
+                for row in conn.execute(select(TicketPrices.seat_class, TicketPrices.screen_format, TicketPrices.price))
+            }
+        with self._lock:
+            self._prices, self._screen_formats = prices, {}
+            self._loaded_at = time.monotonic()
+            return self._prices, self._screen_formats
+
+    def price(self, seat_class: str, screen_format: str) -> Decimal:
+        prices, _ = self._current()
+        try:
+            return prices[(seat_class, screen_format)]
+        except KeyError:
+            raise PricingError(f'No ticket price for {seat_class} seats on {screen_format} screens')
+
+    def price_matrix(self) -> Dict[str, Dict[str, str]]:
+        """{seat_class: {screen_format: price}} as passed to sp_create_reservation"""
+        prices, _ = self._current()
+        matrix: Dict[str, Dict[str, str]] = {}
+        for (seat_class, screen_format), price in prices.items():
+            matrix.setdefault(seat_class, {})[screen_format] = str(price)
+        return matrix
+
+    def screen_format(self, screen_id: int) -> str:
+        _, formats = self._current()
+        with self._lock:
+            screen_format = formats.get(screen_id)
+        if screen_format is None:
+            with self._db.engine.connect() as conn:
+                screen_format = conn.execute(
+                    select(Screens.screen_format).where(Screens.screen_id == screen_id)
+                ).scalar_one()
+            with self._lock:
+                formats[screen_id] = screen_format
+        return screen_format
+
+    def quote(self, layout: ScreenLayout, seat_ids: List[int]) -> Dict[str, Any]:
+        """Price each seat of a screen layout; raises KeyError for unknown seats"""
+        screen_format = self.screen_format(layout.screen_id)
+        lines = []
+        total = Decimal('0.00')
+        for seat_id in seat_ids:
+            position = layout.index[seat_id]
+            seat_class = SEAT_CLASSES[layout.classes[position]]
+            price = self.price(seat_class, screen_format)
+            total += price
+            lines.append({
+                'seat_id': seat_id,
+                'seat_label': layout.labels[position],
+                'seat_class': seat_class,
+                'price': float(price)
+            })
+        return {'screen_format': screen_format, 'seats': lines, 'total': float(total)}
+
+
+pricing_engine = PricingEngine()
@@ -0,0 +1,212 @@
+"""
+In-memory full-text search over the movie catalog.
+
+An inverted index maps every token of a movie's title, director, cast and
+genre to the movies containing it, weighted by field (a title match counts
+more than a genre match). Tokens are accent-folded and case-folded, so
+"amelie" finds "Amélie". The token list is kept sorted, so every query token
+is also matched as a prefix of indexed tokens (typeahead): "aud tau" finds
+"Audrey Tautou". A movie must match every query token; results are ranked by
+the summed weights, exact token matches scoring above prefix matches.
+
+The index is built from the database at startup and kept current by the
+movie write handlers calling ``upsert``/``remove`` after their commit. It is
+per process; it is rebuilt every SEARCH_INDEX_MAX_AGE seconds to pick up
+writes made elsewhere.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+from models import Movies
+
+# Weight of a token found in each field
+FIELD_WEIGHTS = (('title', 3.0), ('director', 2.0), ('cast', 2.0), ('genre', 1.0))
+# Prefix matches score this fraction of an exact token match
+PREFIX_FACTOR = 0.5
+# Bonus for a movie whose title starts with the whole query
+TITLE_PREFIX_BONUS = 1.0
+# Most indexed tokens one short query prefix expands to
+MAX_EXPANSIONS = 500
+
+# Columns kept for each search result
+RESULT_FIELDS = ('movie_id', 'title', 'director', 'genre', 'rating', 'status', 'poster_url')
+# Columns read to index a movie
+_COLUMNS = tuple(dict.fromkeys(RESULT_FIELDS + tuple(field for field, _ in FIELD_WEIGHTS)))
+
+_TOKEN = re.compile(r'\w+')
+# Letters with a stroke rather than a combining accent, which NFKD leaves as they are
+_STROKED = str.maketrans({'đ': 'd', 'Đ': 'D'})
+
+
+def fold(text: Optional[str]) -> str:
+    """Lower-case text with accents removed"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text.translate(_STROKED))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(fold(text))
+
+
+class SearchIndex:
+    """Inverted index: token -> {movie_id: weight}, with a sorted token list"""
+
+    def __init__(self):
+        self._db = None
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms: List[str] = []
+        # movie_id -> (tokens it was indexed under, result fields, title tokens joined)
+        self._docs: Dict[int, tuple] = {}
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        # Bumped by upsert/remove so a build that raced a write is redone
+        self._generation = 0
+        self._building = False
+        self.max_age = 600.0
+
+    def init_app(self, app, db):
+        self._db = db
+        self.max_age = float(app.config.get('SEARCH_INDEX_MAX_AGE', 600))
+
+    def build(self, attempts: int = 3):
+        """(Re)build the whole index from the movies table"""
+        query = select(*(getattr(Movies, column) for column in _COLUMNS))
+        for attempt in range(attempts):
+            with self._lock:
+                generation = self._generation
+            with self._db.engine.connect() as conn:
+                rows = conn.execute(query).all()
+            postings: Dict[str, Dict[int, float]] = {}
+            docs = {}
+            for row in rows:
+                docs[row.movie_id] = self._document(row._mapping, postings)
+            with self._lock:
+                # A write landed while reading: its change may be missing from rows
+                if generation != self._generation and attempt < attempts - 1:
+                    continue
+                self._postings = postings
+                self._terms = sorted(postings)
+                self._docs = docs
+                self._built_at = time.monotonic()
+                return
+
+    @staticmethod
+    def _document(movie, postings: Dict[str, Dict[int, float]]) -> tuple:
+        """Add a movie's tokens to postings; returns its _docs entry"""
+        movie_id = movie['movie_id']
+        tokens: Set[str] = set()
+        for field, weight in FIELD_WEIGHTS:
+            for token in set(tokenize(movie[field])):
+                entries = postings.setdefault(token, {})
+                entries[movie_id] = entries.get(movie_id, 0.0) + weight
+                tokens.add(token)
+        result = {field: movie[field] for field in RESULT_FIELDS}
+        return tokens, result, ' '.join(tokenize(movie['title']))
+
+    def upsert(self, movie: Movies):
+        """Index a created or updated movie (replacing its previous entry)"""
+        movie_fields = {column: getattr(movie, column) for column in _COLUMNS}
+        with self._lock:
+            self._generation += 1
+            self._remove(movie.movie_id)
+            new_postings: Dict[str, Dict[int, float]] = {}
+            doc = self._document(movie_fields, new_postings)
+            for token, entries in new_postings.items():
+                if token not in self._postings:
+                    self._postings[token] = {}
+                    bisect.insort(self._terms, token)
+                self._postings[token].update(entries)
+            self._docs[movie.movie_id] = doc
+
+    def remove(self, movie_id: int):
+        """Drop a deleted movie from the index"""
+        with self._lock:
+            self._generation += 1
+            self._remove(movie_id)
+
+    def _remove(self, movie_id: int):
+        doc = self._docs.pop(movie_id, None)
+        if doc is None:
+            return
+        for token in doc[0]:
+            entries = self._postings.get(token)
+            if entries is None:
+                continue
+            entries.pop(movie_id, None)
+            if not entries:
+                del self._postings[token]
+                position = bisect.bisect_left(self._terms, token)
+                if position < len(self._terms) and self._terms[position] == token:
+                    del self._terms[position]
+
+    def _ensure_current(self):
+        """Rebuild an outdated index; other searches keep using the old one meanwhile"""
+        with self._lock:
+            if self._building:
+                return
+            if self._built_at is not None and time.monotonic() - self._built_at < self.max_age:
+                return
+            self._building = True
+        try:
+            self.build()
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _matches(self, token: str) -> Dict[int, float]:
+        """Best score per movie for one query token, exact or as a prefix"""
+        scores: Dict[int, float] = {}
+        start = bisect.bisect_left(self._terms, token)
+        for term in self._terms[start:start + MAX_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            factor = 1.0 if term == token else PREFIX_FACTOR
+            for movie_id, weight in self._postings[term].items():
+                score = weight * factor
+                if score > scores.get(movie_id, 0.0):
+                    scores[movie_id] = score
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Movies matching every token of query, best first"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        self._ensure_current()
+        folded_query = ' '.join(tokenize(query))
+        with self._lock:
+            totals: Optional[Dict[int, float]] = None
+            # Rarest-looking (longest) tokens first narrow the candidates fastest
+            for token in sorted(tokens, key=len, reverse=True):
+                scores = self._matches(token)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {movie_id: total + scores[movie_id]
+                              for movie_id, total in totals.items() if movie_id in scores}
+                if not totals:
+                    return []
+            results = []
+            for movie_id, score in totals.items():
+                _, fields, title = self._docs[movie_id]
+                if title.startswith(folded_query):
+                    score += TITLE_PREFIX_BONUS
+                results.append((-score, title, movie_id, fields))
+        results.sort(key=lambda result: result[:3])
+        return [dict(fields, score=round(-negative_score, 3))
+                for negative_score, _, _, fields in results[:limit]]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+
+search_index = SearchIndex()
@@ -0,0 +1,84 @@
+"""
+Seat event fan-out hub.
+
+The seat-state engine publishes every versioned seat status change here; each
+showtime has its own set of subscribers (one per open server-sent-events
+stream). Publishing never blocks: a subscriber that falls too far behind is
+marked as overflowed and its stream restarts from a full snapshot.
+"""
+import json
+import queue
+import threading
+from typing import Dict, Set
+
+
+class Subscription:
+    """Bounded event queue for one stream"""
+
+    def __init__(self, showtime_id: int, max_pending: int):
+        self.showtime_id = showtime_id
+        self.events = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def offer(self, event: tuple):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class SeatEventHub:
+    """Per-showtime publish/subscribe of seat status changes"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.max_pending = 256
+        self.heartbeat_seconds = 15.0
+
+    def init_app(self, app):
+        self.max_pending = int(app.config.get('SEAT_EVENTS_MAX_PENDING', 256))
+        self.heartbeat_seconds = float(app.config.get('SEAT_EVENTS_HEARTBEAT', 15))
+
+    def subscribe(self, showtime_id: int) -> Subscription:
+        subscription = Subscription(showtime_id, self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(showtime_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.showtime_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.showtime_id]
+
+    def subscriber_count(self, showtime_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(showtime_id, ()))
+
+    def publish(self, showtime_id: int, version: int, seat_id: int, status: str, event: str):
+        """Deliver one change to every subscriber of the showtime"""
+        with self._lock:
+            subscribers = self._subscribers.get(showtime_id)
+            if not subscribers:
+                return
+            subscribers = tuple(subscribers)
+        change = (version, seat_id, status, event)
+        for subscription in subscribers:
+            subscription.offer(change)
+
+
+def format_sse(data: dict, event_id=None, event: str = None) -> str:
+    """Encode one server-sent event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+seat_event_hub = SeatEventHub()
@@ -0,0 +1,109 @@
+"""
+Best-available seat finder.
+
+Builds a row x column occupancy grid for a showtime as one integer bitmask per
+row (bit ``c`` set when column ``c`` is free and of the requested class). The
+masks are built from slices of the status vector with byte translation, and
+runs of N adjacent free seats are found for a whole row at once with
+shift-and-AND operations instead of testing seats one by one. Candidate blocks
+are ranked by distance from the middle of the row and from the preferred
+viewing row.
+"""
+import math
+from typing import List, Optional
+
+from layout_cache import SEAT_CLASSES, ScreenLayout
+from seat_state import AVAILABLE
+
+# Preferred viewing row as a fraction of the depth of the room (0 = front row)
+PREFERRED_ROW_DEPTH = 0.6
+# Weight of the row distance relative to the distance from the row centre
+ROW_WEIGHT = 1.5
+
+# Byte tables mapping a status / class code to an ASCII binary digit
+_FREE_DIGITS = bytes(b'1'[0] if code == AVAILABLE else b'0'[0] for code in range(256))
+_CLASS_DIGITS = [
+    bytes(b'1'[0] if code == class_code else b'0'[0] for code in range(256))
+    for class_code in range(len(SEAT_CLASSES))
+]
+
+
+def run_starts(mask: int, count: int) -> int:
+    """Bitmask of columns c such that columns c .. c+count-1 are all set in mask"""
+    result = mask
+    span = 1
+    while span < count and result:
+        step = min(span, count - span)
+        result &= result >> step
+        span += step
+    return result
+
+
+def _row_mask(codes: bytes, table: bytes, cols, start: int, end: int) -> int:
+    """Bitmask over column numbers of the seats whose code maps to 1"""
+    digits = codes[start:end].translate(table)
+    if cols[end - 1] - cols[start] == end - start - 1:
+        # Contiguous columns: the digit string is the mask, lowest column last
+        return int(digits[::-1], 2) << cols[start]
+    mask = 0
+    for offset, digit in enumerate(digits):
+        if digit == 49:  # b'1'
+            mask |= 1 << cols[start + offset]
+    return mask
+
+
+def find_best_block(layout: ScreenLayout, status_codes: bytes, count: int,
+                    seat_class: Optional[str] = None) -> Optional[List[int]]:
+    """Layout positions of the best block of ``count`` adjacent available seats.
+
+    Returns None when no row has such a block.
+    """
+    grid = layout.grid()
+    if count < 1 or not grid:
+        return None
+    class_table = _CLASS_DIGITS[SEAT_CLASSES.index(seat_class)] if seat_class else None
+    cols = layout.cols
+
+    first_row, last_row = grid[0][0], grid[-1][0]
+    depth = max(1, last_row - first_row)
+    preferred_row = first_row + depth * PREFERRED_ROW_DEPTH
+
+    # Visit rows nearest the preferred row first so later rows can be pruned
+    rows = sorted(grid, key=lambda entry: abs(entry[0] - preferred_row))
+
+    best = None
+    for row, start, end in rows:
+        row_penalty = ROW_WEIGHT * abs(row - preferred_row) / depth
+        if best is not None and row_penalty >= best[0]:
+            # Even a perfectly centred block in this or any later row cannot win
+            break
+
+        free = _row_mask(status_codes, _FREE_DIGITS, cols, start, end)
+        if class_table is not None:
+            free &= _row_mask(layout.classes, class_table, cols, start, end)
+        starts = run_starts(free, count)
+        if not starts:
+            continue
+
+        # The most central start is the set bit nearest the ideal start column
+        ideal = (cols[start] + cols[end - 1] - (count - 1)) / 2
+        split = max(0, math.ceil(ideal))
+        candidates = []
+        above = starts >> split
+        if above:
+            candidates.append(split + (above & -above).bit_length() - 1)
+        below = starts & ((1 << split) - 1)
+        if below:
+            candidates.append(below.bit_length() - 1)
+
+        width = max(1, cols[end - 1] - cols[start])
+        for col in candidates:
+            score = abs(col - ideal) / width + row_penalty
+            if best is None or score < best[0]:
+                best = (score, row, col, start, end)
+
+    if best is None:
+        return None
+    _, _, col, start, end = best
+    positions = {cols[position]: position for position in range(start, end)}
+    return [positions[c] for c in range(col, col + count)]
@@ -0,0 +1,262 @@
+"""
+Seat lock stores with compare-and-set semantics.
+
+A lock is taken, extended or released in one atomic step per request, so two
+users racing for the same seat cannot both pass a "is it free?" check: one of
+them gets the seat and the other gets a conflict, never a database error.
+Every operation is all or nothing over the requested seats.
+
+Two backends, chosen with ``SEAT_LOCK_BACKEND``:
+
+``sql``
+    The ``seat_locks`` table, written with a single conditional upsert. This is
+    the backend sp_create_reservation relies on and the default.
+``memory``
+    A process-local key-value map, standing in for an external key-value store
+    in local development and in the contention benchmark. Locks are not visible
+    to other processes or to the stored procedures.
+"""
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import OperationalError
+
+from models import SeatLocks
+
+logger = logging.getLogger(__name__)
+
+# MySQL error codes worth retrying: deadlock, lock wait timeout
+_RETRYABLE_ERRORS = (1213, 1205)
+
+
+class LockResult(NamedTuple):
+    success: bool
+    # Seats that made the operation fail (held by another user, or not held)
+    failed: List[int]
+    expires_at: Optional[datetime] = None
+
+
+class _Rejected(Exception):
+    """Raised inside a transaction to roll it back and return a failed result"""
+
+    def __init__(self, result: LockResult):
+        super().__init__(result.failed)
+        self.result = result
+
+
+class SeatLockStore(ABC):
+    """Interface of a seat lock backend; seat_ids are locked all or nothing"""
+
+    @abstractmethod
+    def acquire(self, showtime_id: int, seat_ids: Iterable[int], user_id: int,
+                ttl: timedelta) -> LockResult:
+        """Lock seats for user_id, or extend the user's own locks on them"""
+
+    @abstractmethod
+    def extend(self, showtime_id: int, seat_ids: Iterable[int], user_id: int,
+               ttl: timedelta) -> LockResult:
+        """Push back the expiry of live locks the user already holds"""
+
+    @abstractmethod
+    def release(self, showtime_id: int, seat_ids: Iterable[int], user_id: int) -> LockResult:
+        """Drop locks the user holds"""
+
+
+class SqlSeatLockStore(SeatLockStore):
+    """Locks in the seat_locks table, one conditional statement per operation"""
+
+    def __init__(self, db, retries: int = 3):
+        self._db = db
+        self.retries = retries
+
+    def _run(self, operation, *args):
+        """Run operation(conn, *args) in its own transaction, retrying deadlocks"""
+        for attempt in range(self.retries):
+            try:
+                with self._db.engine.begin() as conn:
+                    return operation(conn, *args)
+            except _Rejected as rejected:
+                return rejected.result
+            except OperationalError as e:
+                code = e.orig.args[0] if e.orig is not None and e.orig.args else None
+                if code not in _RETRYABLE_ERRORS or attempt == self.retries - 1:
+                    raise
+                logger.warning(f"Retrying seat lock operation after MySQL error {code}")
+
+    def acquire(self, showtime_id, seat_ids, user_id, ttl):
+        return self._run(self._acquire, showtime_id, sorted(set(seat_ids)), user_id, ttl)
+
+    def _acquire(self, conn, showtime_id, seat_ids, user_id, ttl):
+        now = datetime.utcnow()
+        expires_at = now + ttl
+        upsert = mysql_insert(SeatLocks).values([
+            {
+                'showtime_id': showtime_id,
+                'seat_id': seat_id,
+                'user_id': user_id,
+                'locked_at': now,
+                'expires_at': expires_at
+            }
+            for seat_id in seat_ids
+        ])
+        # Assignments run left to right and see earlier ones: take over the row
+        # only if the old lock has expired, then move expires_at only if the
+        # row now belongs to the caller (a takeover or the caller's own lock)
+        upsert = upsert.on_duplicate_key_update([
+            ('locked_at', case((SeatLocks.expires_at <= now, upsert.inserted.locked_at),
+                               else_=SeatLocks.locked_at)),
+            ('user_id', case((SeatLocks.expires_at <= now, upsert.inserted.user_id),
+                             else_=SeatLocks.user_id)),
+            ('expires_at', case((SeatLocks.user_id == upsert.inserted.user_id, upsert.inserted.expires_at),
+                                else_=SeatLocks.expires_at))
+        ])
+        conn.execute(upsert)
+
+        # Rows the upsert left alone are live locks of other users
+        failed = conn.execute(
+            select(SeatLocks.seat_id).where(
+                SeatLocks.showtime_id == showtime_id,
+                SeatLocks.seat_id.in_(seat_ids),
+                SeatLocks.user_id != user_id
+            )
+        ).scalars().all()
+        if failed:
+            raise _Rejected(LockResult(False, sorted(failed)))
+        return LockResult(True, [], expires_at)
+
+    def extend(self, showtime_id, seat_ids, user_id, ttl):
+        return self._run(self._extend, showtime_id, sorted(set(seat_ids)), user_id, ttl)
+
+    def _extend(self, conn, showtime_id, seat_ids, user_id, ttl):
+        now = datetime.utcnow()
+        expires_at = now + ttl
+        held = and_(
+            SeatLocks.showtime_id == showtime_id,
+            SeatLocks.seat_id.in_(seat_ids),
+            SeatLocks.user_id == user_id,
+            SeatLocks.expires_at > now
+        )
+        extended = conn.execute(update(SeatLocks).where(held).values(expires_at=expires_at)).rowcount
+        if extended != len(seat_ids):
+            raise _Rejected(LockResult(False, self._not_held(conn, showtime_id, seat_ids, user_id, now)))
+        return LockResult(True, [], expires_at)
+
+    def release(self, showtime_id, seat_ids, user_id):
+        return self._run(self._release, showtime_id, sorted(set(seat_ids)), user_id)
+
+    def _release(self, conn, showtime_id, seat_ids, user_id):
+        released = conn.execute(
+            delete(SeatLocks).where(
+                SeatLocks.showtime_id == showtime_id,
+                SeatLocks.seat_id.in_(seat_ids),
+                SeatLocks.user_id == user_id
+            )
+        ).rowcount
+        if released != len(seat_ids):
+            raise _Rejected(LockResult(False, self._not_held(conn, showtime_id, seat_ids, user_id)))
+        return LockResult(True, [])
+
+    @staticmethod
+    def _not_held(conn, showtime_id, seat_ids, user_id, now=None) -> List[int]:
+        query = select(SeatLocks.seat_id).where(
+            SeatLocks.showtime_id == showtime_id,
+            SeatLocks.seat_id.in_(seat_ids),
+            SeatLocks.user_id == user_id
+        )
+        if now is not None:
+            query = query.where(SeatLocks.expires_at > now)
+        held = set(conn.execute(query).scalars().all())
+        return [seat_id for seat_id in seat_ids if seat_id not in held]
+
+
+class InMemorySeatLockStore(SeatLockStore):
+    """Locks in a process-local map of (showtime_id, seat_id) -> (user_id, expiry)
+
+    Showtimes are spread over a fixed set of mutexes so unrelated showtimes do
+    not contend; each operation holds one mutex for its whole check-and-set.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._locks: Dict[Tuple[int, int], Tuple[int, float]] = {}
+        self._mutexes = [threading.Lock() for _ in range(stripes)]
+
+    def _mutex(self, showtime_id: int) -> threading.Lock:
+        return self._mutexes[showtime_id % len(self._mutexes)]
+
+    def acquire(self, showtime_id, seat_ids, user_id, ttl):
+        seat_ids = sorted(set(seat_ids))
+        now = time.time()
+        with self._mutex(showtime_id):
+            failed = []
+            for seat_id in seat_ids:
+                held = self._locks.get((showtime_id, seat_id))
+                if held is not None and held[0] != user_id and held[1] > now:
+                    failed.append(seat_id)
+            if failed:
+                return LockResult(False, failed)
+            expiry = now + ttl.total_seconds()
+            for seat_id in seat_ids:
+                self._locks[(showtime_id, seat_id)] = (user_id, expiry)
+        return LockResult(True, [], datetime.utcfromtimestamp(expiry))
+
+    def extend(self, showtime_id, seat_ids, user_id, ttl):
+        seat_ids = sorted(set(seat_ids))
+        now = time.time()
+        with self._mutex(showtime_id):
+            failed = [seat_id for seat_id in seat_ids if not self._holds(showtime_id, seat_id, user_id, now)]
+            if failed:
+                return LockResult(False, failed)
+            expiry = now + ttl.total_seconds()
+            for seat_id in seat_ids:
+                self._locks[(showtime_id, seat_id)] = (user_id, expiry)
+        return LockResult(True, [], datetime.utcfromtimestamp(expiry))
+
+    def release(self, showtime_id, seat_ids, user_id):
+        seat_ids = sorted(set(seat_ids))
+        with self._mutex(showtime_id):
+            failed = [seat_id for seat_id in seat_ids if not self._holds(showtime_id, seat_id, user_id)]
+            if failed:
+                return LockResult(False, failed)
+            for seat_id in seat_ids:
+                del self._locks[(showtime_id, seat_id)]
+        return LockResult(True, [])
+
+    def _holds(self, showtime_id, seat_id, user_id, now=None) -> bool:
+        held = self._locks.get((showtime_id, seat_id))
+        return held is not None and held[0] == user_id and (now is None or held[1] > now)
+
+
+class SeatLocksBackend(SeatLockStore):
+    """The configured seat lock store, set up by init_app"""
+
+    def __init__(self):
+        self._store: Optional[SeatLockStore] = None
+        self.ttl = timedelta(minutes=15)
+
+    def init_app(self, app, db):
+        backend = app.config.get('SEAT_LOCK_BACKEND', 'sql')
+        if backend == 'sql':
+            self._store = SqlSeatLockStore(db)
+        elif backend == 'memory':
+            self._store = InMemorySeatLockStore()
+        else:
+            raise ValueError(f"Unknown SEAT_LOCK_BACKEND: {backend}")
+        self.ttl = timedelta(seconds=int(app.config.get('SEAT_LOCK_TTL', 900)))
+
+    def acquire(self, showtime_id, seat_ids, user_id, ttl=None):
+        return self._store.acquire(showtime_id, seat_ids, user_id, ttl or self.ttl)
+
+    def extend(self, showtime_id, seat_ids, user_id, ttl=None):
+        return self._store.extend(showtime_id, seat_ids, user_id, ttl or self.ttl)
+
+    def release(self, showtime_id, seat_ids, user_id):
+        return self._store.release(showtime_id, seat_ids, user_id)
+
+
+seat_lock_store = SeatLocksBackend()
@@ -0,0 +1,357 @@
+"""
+In-memory seat-state engine.
+
+Keeps one compact status vector per showtime (one byte per seat, indexed by the
+seat's position in the screen layout) so seat-map reads are served without a
+database round trip. The vector is loaded once from the database and then kept
+current by the booking code paths (lock, unlock, reserve, cancel), which report
+their committed changes through the ``apply_*`` methods.
+
+Every effective status change bumps a per-showtime version and is appended to a
+bounded change log, so clients can ask for the seats that changed since the
+version they last saw. Registered listeners (e.g. the seat event hub) are
+told about each change as it is recorded.
+
+State is per process. Each showtime is re-synchronised from the database once
+it is older than ``SEAT_STATE_MAX_AGE`` seconds, which bounds drift caused by
+writes made in other worker processes or directly in the database.
+"""
+import threading
+import time
+import uuid
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from layout_cache import ScreenLayout, layout_cache
+from seat_status import stream_seat_statuses
+from models import Showtimes
+
+AVAILABLE = 0
+LOCKED = 1
+SOLD = 2
+STATUS_NAMES = ('available', 'locked', 'sold')
+
+NO_EXPIRY = float('inf')
+
+
+class ShowtimeSeatState:
+    """Status vector and change log for a single showtime.
+
+    Methods prefixed with an underscore expect the caller to hold ``mutex``.
+    """
+
+    __slots__ = ('showtime_id', 'layout', 'index', 'status', 'lock_owner', 'lock_expiry',
+                 'next_expiry', 'version', 'floor', 'changes', 'loaded_at', 'mutex', 'listener')
+
+    def __init__(self, showtime_id: int, layout: ScreenLayout, log_size: int = 1024,
+                 listener: Optional[Callable] = None):
+        self.showtime_id = showtime_id
+        self.layout = layout
+        self.index = layout.index
+        self.status = bytearray(len(layout))
+        self.lock_owner = array('i', [0]) * len(layout)
+        self.lock_expiry = array('d', [0.0]) * len(layout)
+        self.next_expiry = NO_EXPIRY
+        # Versions start from the wall clock (ms) so a reloaded state never
+        # reuses a version number handed out by the state it replaced.
+        # Changes after ``floor`` are still in the log.
+        self.version = self.floor = time.time_ns() // 1_000_000
+        self.changes = deque(maxlen=log_size)
+        self.loaded_at = time.monotonic()
+        self.mutex = threading.Lock()
+        self.listener = listener
+
+    def _record(self, position: int, status: int, event: str):
+        self.version += 1
+        if len(self.changes) == self.changes.maxlen:
+            self.floor = self.changes[0][0]
+        self.changes.append((self.version, position, status, event))
+        if self.listener is not None:
+            self.listener(self.showtime_id, self.version, self.layout.seat_ids[position],
+                          STATUS_NAMES[status], event)
+
+    def _set(self, position: int, status: int, event: str, owner: int = 0, expiry: float = 0.0) -> bool:
+        previous = self.status[position]
+        self.status[position] = status
+        self.lock_owner[position] = owner
+        self.lock_expiry[position] = expiry
+        if status == LOCKED and expiry < self.next_expiry:
+            self.next_expiry = expiry
+        if previous != status:
+            self._record(position, status, event)
+            return True
+        return False
+
+    def _expire_locks(self, now: float):
+        """Turn locks past their expiry into available seats"""
+        if now < self.next_expiry:
+            return
+        next_expiry = NO_EXPIRY
+        for position, status in enumerate(self.status):
+            if status != LOCKED:
+                continue
+            expiry = self.lock_expiry[position]
+            if expiry <= now:
+                self._set(position, AVAILABLE, 'expired')
+            elif expiry < next_expiry:
+                next_expiry = expiry
+        self.next_expiry = next_expiry
+
+    def expire_due(self) -> float:
+        """Expire locks that are past due; returns the next lock expiry timestamp"""
+        with self.mutex:
+            self._expire_locks(datetime.utcnow().timestamp())
+            return self.next_expiry
+
+    def status_codes(self) -> Tuple[int, bytes]:
+        """Current version and raw status codes in layout order"""
+        with self.mutex:
+            self._expire_locks(datetime.utcnow().timestamp())
+            return self.version, bytes(self.status)
+
+    def snapshot(self) -> Tuple[int, List[str]]:
+        """Current version and per-seat status names in layout order"""
+        with self.mutex:
+            self._expire_locks(datetime.utcnow().timestamp())
+            return self.version, [STATUS_NAMES[status] for status in self.status]
+
+    def to_list(self, statuses: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Serialize the seat map in the same shape as the seats endpoint"""
+        if statuses is None:
+            statuses = self.snapshot()[1]
+        return self.layout.with_status(statuses)
+
+    def changes_since(self, since: int) -> Tuple[int, bool, List[Dict[str, Any]]]:
+        """Seats whose status changed after version ``since``.
+
+        Returns ``(version, reset, changes)``. ``reset`` is True when the log
+        no longer reaches back to ``since`` (or ``since`` comes from another
+        process); ``changes`` then lists every seat.
+        """
+        seat_ids = self.layout.seat_ids
+        with self.mutex:
+            self._expire_locks(datetime.utcnow().timestamp())
+            if since < self.floor or since > self.version:
+                return self.version, True, [
+                    {'seat_id': seat_ids[position], 'status': STATUS_NAMES[status]}
+                    for position, status in enumerate(self.status)
+                ]
+            latest = {}
+            for version, position, status, event in reversed(self.changes):
+                if version <= since:
+                    break
+                latest.setdefault(position, (status, event))
+            current = self.version
+        changes = [
+            {'seat_id': seat_ids[position], 'status': STATUS_NAMES[status], 'event': event}
+            for position, (status, event) in sorted(latest.items())
+        ]
+        return current, False, changes
+
+
+class SeatStateEngine:
+    """Process-wide registry of per-showtime seat status vectors"""
+
+    def __init__(self):
+        self._db = None
+        self._max_age = 60.0
+        self._log_size = 1024
+        self._states: Dict[int, ShowtimeSeatState] = {}
+        # showtime_id -> dirty flag for loads in progress
+        self._loading: Dict[int, bool] = {}
+        # Mutations hold this lock so they cannot interleave with a state swap
+        self._lock = threading.Lock()
+        self._listeners: List[Callable] = []
+        # Distinguishes versions issued by this process from other processes
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def init_app(self, app, db):
+        """Bind the engine to the app's database and configuration"""
+        self._db = db
+        self._max_age = float(app.config.get('SEAT_STATE_MAX_AGE', 60))
+        self._log_size = int(app.config.get('SEAT_STATE_CHANGE_LOG_SIZE', 1024))
+
+    def add_listener(self, listener: Callable):
+        """Register ``listener(showtime_id, version, seat_id, status, event)``.
+
+        Listeners run while the showtime's state is locked and must not block.
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _notify(self, showtime_id, version, seat_id, status, event):
+        for listener in self._listeners:
+            listener(showtime_id, version, seat_id, status, event)
+
+    def get(self, showtime_id: int) -> Optional[ShowtimeSeatState]:
+        """Return the state for a showtime, loading it on first use.
+
+        Returns None when the showtime does not exist.
+        """
+        with self._lock:
+            state = self._states.get(showtime_id)
+        if (state is not None and not state.layout.stale
+                and time.monotonic() - state.loaded_at < self._max_age):
+            return state
+        return self._load(showtime_id, state)
+
+    def etag(self, showtime_id: int, version: int) -> str:
+        """Entity tag for one version of a showtime's seat map"""
+        return f'{self.epoch}-{showtime_id}-{version}'
+
+    def invalidate(self, showtime_id: int):
+        """Drop the cached state so the next read reloads it"""
+        with self._lock:
+            self._states.pop(showtime_id, None)
+            if showtime_id in self._loading:
+                self._loading[showtime_id] = True
+
+    def apply_lock(self, showtime_id: int, seat_ids: Iterable[int], user_id: int, expires_at: datetime):
+        """Record committed seat locks"""
+        expiry = expires_at.timestamp()
+        with self._lock:
+            state = self._loaded(showtime_id)
+            if state is None:
+                return
+            with state.mutex:
+                for position in self._positions(state, seat_ids):
+                    if state.status[position] != SOLD:
+                        state._set(position, LOCKED, 'locked', user_id, expiry)
+
+    def apply_unlock(self, showtime_id: int, seat_ids: Iterable[int]):
+        """Record released seat locks (seats that are sold stay sold)"""
+        with self._lock:
+            state = self._loaded(showtime_id)
+            if state is None:
+                return
+            with state.mutex:
+                for position in self._positions(state, seat_ids):
+                    if state.status[position] == LOCKED:
+                        state._set(position, AVAILABLE, 'unlocked')
+
+    def apply_sold(self, showtime_id: int, seat_ids: Iterable[int]):
+        """Record seats sold by a committed reservation"""
+        with self._lock:
+            state = self._loaded(showtime_id)
+            if state is None:
+                return
+            with state.mutex:
+                for position in self._positions(state, seat_ids):
+                    state._set(position, SOLD, 'sold')
+
+    def apply_expired(self, showtime_id: int, seat_ids: Iterable[int]):
+        """Record seats freed by an expired pending reservation"""
+        with self._lock:
+            state = self._loaded(showtime_id)
+            if state is None:
+                return
+            with state.mutex:
+                for position in self._positions(state, seat_ids):
+                    if state.status[position] == SOLD:
+                        state._set(position, AVAILABLE, 'released')
+
+    def apply_cancel(self, showtime_id: int, seat_ids: Iterable[int], user_id: int):
+        """Record a cancelled reservation.
+
+        Mirrors sp_cancel_reservation: the reservation's seats are freed and every
+        lock the user holds on the showtime is released.
+        """
+        with self._lock:
+            state = self._loaded(showtime_id)
+            if state is None:
+                return
+            with state.mutex:
+                for position in self._positions(state, seat_ids):
+                    state._set(position, AVAILABLE, 'released')
+                for position, owner in enumerate(state.lock_owner):
+                    if owner == user_id and state.status[position] == LOCKED:
+                        state._set(position, AVAILABLE, 'unlocked')
+
+    @staticmethod
+    def _positions(state: ShowtimeSeatState, seat_ids: Iterable[int]):
+        for seat_id in seat_ids:
+            position = state.index.get(seat_id)
+            if position is not None:
+                yield position
+
+    def _loaded(self, showtime_id: int) -> Optional[ShowtimeSeatState]:
+        """Look up a state for mutation; the caller holds ``self._lock``"""
+        if showtime_id in self._loading:
+            # A load is reading the database right now and may miss this change
+            self._loading[showtime_id] = True
+        return self._states.get(showtime_id)
+
+    def _load(self, showtime_id: int, previous: Optional[ShowtimeSeatState],
+              attempts: int = 3) -> Optional[ShowtimeSeatState]:
+        state = None
+        for _ in range(attempts):
+            with self._lock:
+                self._loading[showtime_id] = False
+            state = None
+            try:
+                state = self._read(showtime_id)
+            finally:
+                with self._lock:
+                    dirty = self._loading.pop(showtime_id, False)
+                    if state is not None and not dirty:
+                        current = self._states.get(showtime_id)
+                        if current is not None:
+                            self._carry_over(current, state)
+                        self._states[showtime_id] = state
+            if state is None:
+                self.invalidate(showtime_id)
+                return None
+            if not dirty:
+                return state
+        # Under constant churn keep serving the state that saw every change
+        if previous is not None:
+            previous.loaded_at = time.monotonic()
+            return previous
+        return state
+
+    @staticmethod
+    def _carry_over(old: ShowtimeSeatState, new: ShowtimeSeatState):
+        """Continue the old state's version sequence in a freshly read state"""
+        with old.mutex:
+            old._expire_locks(datetime.utcnow().timestamp())
+            if old.layout is new.layout:
+                new.version, new.floor, new.changes = old.version, old.floor, old.changes
+                for position, status in enumerate(new.status):
+                    if status != old.status[position]:
+                        new._record(position, status, 'resync')
+            else:
+                # Seat positions moved; clients must refetch the whole map
+                new.version = new.floor = max(new.version, old.version + 1)
+
+    def _read(self, showtime_id: int) -> Optional[ShowtimeSeatState]:
+        """Build a state from the database on a dedicated connection"""
+        with self._db.engine.connect() as conn:
+            screen_id = conn.execute(
+                select(Showtimes.screen_id).where(Showtimes.showtime_id == showtime_id)
+            ).scalar_one_or_none()
+            if screen_id is None:
+                return None
+
+            state = ShowtimeSeatState(showtime_id, layout_cache.get(screen_id, conn),
+                                      self._log_size, self._notify)
+
+            # One pass over the set-based status query fills the arrays
+            for row in stream_seat_statuses(conn, showtime_id):
+                position = state.index.get(row.seat_id)
+                if position is None or row.status == 'available':
+                    continue
+                if row.status == 'sold':
+                    state.status[position] = SOLD
+                else:
+                    state.status[position] = LOCKED
+                    state.lock_owner[position] = row.lock_user_id
+                    state.lock_expiry[position] = row.lock_expires_at.timestamp()
+                    state.next_expiry = min(state.next_expiry, state.lock_expiry[position])
+        return state
+
+
+seat_state_engine = SeatStateEngine()
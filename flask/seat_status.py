@@ -0,0 +1,74 @@
+"""
+Set-based seat status query.
+
+One statement returns every seat of a showtime's screen together with its
+computed status ('sold', 'locked' or 'available') and the live lock, if any,
+in layout order. Rows are read with a server-side cursor and turned straight
+into JSON or seat-state arrays, without building ORM objects.
+"""
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import and_, case, literal, select
+from sqlalchemy.engine import Row
+
+from models import Reservations, SeatLocks, Seats, Showtimes, Tickets
+
+# Seat fields sent to clients, in ModelSerializer.serialize_seats order
+SEAT_FIELDS = ('seat_id', 'screen_id', 'seat_class', 'seat_label', 'row_num', 'col_num', 'status')
+
+
+def seat_status_query(showtime_id: int, now: datetime):
+    """SELECT seat layout, status, lock_user_id, lock_expires_at for a showtime"""
+    sold = (
+        select(Tickets.ticket_id)
+        .join(Reservations)
+        .where(
+            Reservations.showtime_id == Showtimes.showtime_id,
+            Reservations.status == 'confirmed',
+            Tickets.seat_id == Seats.seat_id
+        )
+        .exists()
+    )
+    status = case(
+        (sold, literal('sold')),
+        (SeatLocks.seat_id.is_not(None), literal('locked')),
+        else_=literal('available')
+    )
+    return (
+        select(
+            Seats.seat_id, Seats.screen_id, Seats.seat_class, Seats.seat_label,
+            Seats.row_num, Seats.col_num, status.label('status'),
+            SeatLocks.user_id.label('lock_user_id'), SeatLocks.expires_at.label('lock_expires_at')
+        )
+        .select_from(Showtimes)
+        .join(Seats, Seats.screen_id == Showtimes.screen_id)
+        .outerjoin(SeatLocks, and_(
+            SeatLocks.showtime_id == Showtimes.showtime_id,
+            SeatLocks.seat_id == Seats.seat_id,
+            SeatLocks.expires_at > now
+        ))
+        .where(Showtimes.showtime_id == showtime_id)
+        .order_by(Seats.row_num, Seats.col_num)
+    )
+
+
+def stream_seat_statuses(conn, showtime_id: int, now: Optional[datetime] = None,
+                         batch_size: int = 500) -> Iterator[Row]:
+    """Rows of seat_status_query, fetched from a server-side cursor in batches"""
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+        seat_status_query(showtime_id, now or datetime.utcnow())
+    )
+    yield from result
+
+
+def iter_seats_json(rows: Iterable[Row]) -> Iterator[str]:
+    """Encode rows as a JSON array of seat dicts, one chunk per seat"""
+    separator = '['
+    for row in rows:
+        yield separator + json.dumps(
+            {field: getattr(row, field) for field in SEAT_FIELDS}, separators=(',', ':')
+        )
+        separator = ','
+    yield ']' if separator == ',' else '[]'
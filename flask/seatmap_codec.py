@@ -0,0 +1,69 @@
+"""
+Compact binary seat-map encoding (``application/x-seatmap``).
+
+The static part of a seat map (seat ids, labels, rows, columns, classes) is
+identified by a layout hash; clients fetch the layout once as JSON and then
+only need the per-showtime status, which is packed two bits per seat.
+
+Wire format (big-endian)::
+
+    magic      4 bytes   b'SMAP'
+    format     1 byte    FORMAT_VERSION
+    showtime   4 bytes   unsigned int
+    version    8 bytes   unsigned int, seat-map version
+    hash       8 bytes   layout hash (first 8 bytes of SHA-256)
+    count      4 bytes   unsigned int, number of seats
+    status     ceil(count / 4) bytes, 2 bits per seat in layout order,
+               first seat in the two most significant bits
+
+Status codes are the seat-state engine's: 0 available, 1 locked, 2 sold.
+"""
+import struct
+from typing import List, NamedTuple
+
+MEDIA_TYPE = 'application/x-seatmap'
+MAGIC = b'SMAP'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('>4sBIQ8sI')
+
+
+class DecodedSeatMap(NamedTuple):
+    showtime_id: int
+    version: int
+    layout_hash: str
+    status_codes: List[int]
+
+
+def pack_status(status_codes: bytes) -> bytes:
+    """Pack one status code (0-3) per seat into two bits per seat"""
+    packed = bytearray((len(status_codes) + 3) // 4)
+    for position, code in enumerate(status_codes):
+        packed[position >> 2] |= (code & 0b11) << (6 - 2 * (position & 3))
+    return bytes(packed)
+
+
+def unpack_status(packed: bytes, count: int) -> List[int]:
+    """Inverse of pack_status"""
+    return [(packed[position >> 2] >> (6 - 2 * (position & 3))) & 0b11 for position in range(count)]
+
+
+def encode(showtime_id: int, version: int, hash_hex: str, status_codes: bytes) -> bytes:
+    """Encode a seat map; ``hash_hex`` is ScreenLayout.fingerprint()"""
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, showtime_id, version,
+                          bytes.fromhex(hash_hex), len(status_codes))
+    return header + pack_status(status_codes)
+
+
+def decode(payload: bytes) -> DecodedSeatMap:
+    """Decode an application/x-seatmap body; raises ValueError if malformed"""
+    if len(payload) < _HEADER.size:
+        raise ValueError('Seat map payload too short')
+    magic, format_version, showtime_id, version, hash_bytes, count = _HEADER.unpack_from(payload)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError('Not a version 1 seat map payload')
+    packed = payload[_HEADER.size:]
+    if len(packed) != (count + 3) // 4:
+        raise ValueError('Seat map status length does not match seat count')
+    return DecodedSeatMap(showtime_id, version, hash_bytes.hex(), unpack_status(packed, count))
+
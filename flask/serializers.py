@@ -114,6 +114,47 @@ class ModelSerializer:
             'expires_at': seat_lock.expires_at.isoformat()
         }
     
+    # Fields of serialize_movies, each backed by the column of the same name
+    MOVIE_FIELDS = ('movie_id', 'title', 'duration', 'rating', 'release_date', 'status',
+                    'description', 'director', 'cast', 'genre', 'poster_url')
+    
+    @staticmethod
+    def serialize_movie_row(row, fields) -> Dict[str, Any]:
+        """Serialize selected columns of a movie row like serialize_movies"""
+        result = {}
+        for field in fields:
+            value = getattr(row, field)
+            if field == 'release_date':
+                value = value.isoformat() if value else None
+            elif field == 'cast':
+                value = value.split(',') if value else []
+            result[field] = value
+        return result
+    
+    @staticmethod
+    def serialize_showtime_row(row, movie_title: Optional[str]) -> Dict[str, Any]:
+        """Serialize an active-showtime row (v_active_showtimes_details columns) with its screen and cinema"""
+        return {
+            'showtime_id': row.showtime_id,
+            'movie_id': row.movie_id,
+            'screen_id': row.screen_id,
+            'start_time': row.start_time.isoformat(),
+            'end_time': row.end_time.isoformat(),
+            'movie_title': movie_title,
+            'screen': {
+                'screen_id': row.screen_id,
+                'cinema_id': row.cinema_id,
+                'name': row.screen_name,
+                'screen_format': row.screen_format
+            },
+            'cinema': {
+                'cinema_id': row.cinema_id,
+                'name': row.cinema_name,
+                'address': row.cinema_address,
+                'city': row.cinema_city
+            }
+        }
+    
     @staticmethod
     def serialize_movies_list(movies: List[Movies]) -> List[Dict[str, Any]]:
         """Serialize a list of Movies"""
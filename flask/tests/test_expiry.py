@@ -0,0 +1,23 @@
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from expiry import ExpiryReaper
+
+
+def test_rows_still_due_after_a_sweep_do_not_spin(monkeypatch):
+    reaper = ExpiryReaper()
+    reaper._app = Flask(__name__)
+    reaper.retry_delay = 0.2
+    sweeps = []
+    monkeypatch.setattr(reaper, 'sweep', lambda: sweeps.append(time.monotonic()))
+    # A row skipped by SKIP LOCKED keeps the earliest deadline in the past
+    monkeypatch.setattr(reaper, '_earliest_deadline', lambda: datetime.utcnow() - timedelta(minutes=1))
+
+    reaper.start()
+    time.sleep(0.5)
+    reaper.stop()
+    reaper._thread.join(timeout=1)
+
+    assert 2 <= len(sweeps) <= 4
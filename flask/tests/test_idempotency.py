@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+from admission import AdmissionRejected, admission_controller
+from api.v1.reservations.route import reservations_bp
+from extensions import db
+from idempotency import idempotency_store
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    idempotency_store.init_app(app)
+    app.register_blueprint(reservations_bp, url_prefix='/api/v1/reservations')
+    return app.test_client()
+
+
+def test_shed_booking_is_not_replayed(client, monkeypatch):
+    admitted = []
+
+    @contextmanager
+    def shed(showtime_id, user_id=None):
+        admitted.append(showtime_id)
+        raise AdmissionRejected('Too many bookings for this showtime', 2.0)
+        yield
+
+    monkeypatch.setattr(admission_controller, 'admit', shed)
+    body = {'user_id': 1, 'showtime_id': 7, 'seats': [1, 2]}
+    headers = {'Idempotency-Key': 'shed-then-retry'}
+
+    first = client.post('/api/v1/reservations/', json=body, headers=headers)
+    assert first.status_code == 429
+    assert first.headers['Retry-After'] == '2'
+
+    retry = client.post('/api/v1/reservations/', json=body, headers=headers)
+    assert retry.status_code == 429
+    assert 'Idempotent-Replayed' not in retry.headers
+    # The retry reached the handler instead of getting the stored 429
+    assert admitted == [7, 7]
@@ -0,0 +1,20 @@
+import time
+
+from models import Movies
+from search_index import SearchIndex, tokenize
+
+
+def test_tokenize_folds_vietnamese_d():
+    assert tokenize('Đất Rừng Phương Nam') == ['dat', 'rung', 'phuong', 'nam']
+    assert tokenize('đạo diễn') == ['dao', 'dien']
+
+
+def test_unaccented_query_finds_vietnamese_title():
+    index = SearchIndex()
+    # Treat the empty index as freshly built so search does not read the database
+    index._built_at = time.monotonic()
+    index.upsert(Movies(movie_id=1, title='Đất Rừng Phương Nam', director='Nguyễn Quang Dũng',
+                        cast='Hạo Khang', genre='Drama', rating='PG', status='open', poster_url=None))
+
+    assert [result['movie_id'] for result in index.search('dat rung')] == [1]
+    assert [result['movie_id'] for result in index.search('Đất')] == [1]
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+import pytest
+
+from seat_locks import InMemorySeatLockStore, SeatLockStore
+
+
+def test_incomplete_backend_fails_at_construction():
+    class AcquireOnly(SeatLockStore):
+        def acquire(self, showtime_id, seat_ids, user_id, ttl):
+            raise AssertionError('not reached')
+
+    with pytest.raises(TypeError):
+        AcquireOnly()
+
+
+def test_in_memory_store_locks_all_or_nothing():
+    store = InMemorySeatLockStore()
+    ttl = timedelta(minutes=1)
+
+    assert store.acquire(1, [1, 2], user_id=10, ttl=ttl).success
+    conflict = store.acquire(1, [2, 3], user_id=20, ttl=ttl)
+    assert not conflict.success and conflict.failed == [2]
+    assert store.acquire(1, [3], user_id=20, ttl=ttl).success
+    assert store.release(1, [1, 2], user_id=10).success
+    assert store.acquire(1, [2], user_id=20, ttl=ttl).success
@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+import seatmap_codec
+from seatmap_codec import DecodedSeatMap, decode, encode
+
+LAYOUT_HASH = '00112233aabbccdd'
+
+
+@pytest.mark.parametrize('count', [0, 1, 3, 4, 5, 96, 2001])
+def test_round_trip(count):
+    codes = bytes(random.Random(count).choice((0, 1, 2)) for _ in range(count))
+    body = encode(42, 1760000000123, LAYOUT_HASH, codes)
+
+    assert decode(body) == DecodedSeatMap(42, 1760000000123, LAYOUT_HASH, list(codes))
+    assert len(body) == seatmap_codec._HEADER.size + (count + 3) // 4
+
+
+def test_first_seat_is_in_the_high_bits():
+    assert seatmap_codec.pack_status(bytes([2, 1, 0, 1, 2])) == bytes([0b10010001, 0b10000000])
+
+
+@pytest.mark.parametrize('payload, message', [
+    (b'', 'too short'),
+    (encode(1, 1, LAYOUT_HASH, bytes(8))[:10], 'too short'),
+    (encode(1, 1, LAYOUT_HASH, bytes(8))[:-1], 'does not match'),
+    (encode(1, 1, LAYOUT_HASH, bytes(8)) + b'\x00', 'does not match'),
+    (b'XMAP' + encode(1, 1, LAYOUT_HASH, bytes(8))[4:], 'Not a version 1'),
+    (encode(1, 1, LAYOUT_HASH, bytes(8))[:4] + b'\x02' + encode(1, 1, LAYOUT_HASH, bytes(8))[5:], 'Not a version 1'),
+])
+def test_malformed_payload_is_rejected(payload, message):
+    with pytest.raises(ValueError, match=message):
+        decode(payload)
@@ -0,0 +1,37 @@
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from timetable import ENTRY_FIELDS, Timetable, TimetableEntry
+
+
+@pytest.fixture
+def local_utc_plus_7(monkeypatch):
+    """Run with a local clock seven hours ahead of UTC"""
+    monkeypatch.setenv('TZ', 'Asia/Ho_Chi_Minh')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _entry(showtime_id, start_time, end_time):
+    row = SimpleNamespace(**dict.fromkeys(ENTRY_FIELDS))
+    row.showtime_id, row.movie_id, row.cinema_id = showtime_id, 1, 1
+    row.start_time, row.end_time = start_time, end_time
+    return TimetableEntry(row)
+
+
+def test_showtimes_end_on_the_local_clock(local_utc_plus_7):
+    timetable = Timetable()
+    timetable._loaded_at = time.monotonic()
+    now = datetime.now()
+    with timetable._lock:
+        # Ended an hour ago in local time, though still ahead of UTC
+        timetable._add(_entry(1, now - timedelta(hours=3), now - timedelta(hours=1)))
+        timetable._add(_entry(2, now - timedelta(hours=1), now + timedelta(minutes=1)))
+        timetable._add(_entry(3, now + timedelta(hours=2), now + timedelta(hours=4)))
+
+    assert [entry.showtime_id for entry in timetable.for_movie(1)] == [2, 3]
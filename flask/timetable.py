@@ -0,0 +1,219 @@
+"""
+In-memory "now showing" timetable.
+
+Holds the rows of v_active_showtimes_details (showtimes of open movies that
+have not ended, with their screen and cinema) indexed by movie and by
+(cinema, day), each list kept in start_time order, so movie pages list their
+showtimes without querying the view.
+
+The snapshot is loaded once and then changed incrementally: the admin
+handlers report showtimes they create or delete and movies whose status
+changes. Ended showtimes are aged out through a heap ordered by end_time, so
+dropping them costs nothing until one is actually due. The whole snapshot is
+reloaded every TIMETABLE_MAX_AGE seconds to pick up writes made by other
+processes (and cinema or screen renames).
+
+Showtime times are naive local wall-clock values, as the view's
+``end_time > NOW()`` compares them, so "now" here is ``datetime.now()``,
+never UTC.
+"""
+import bisect
+import heapq
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models import Cinemas, Movies, Screens, Showtimes
+
+# Columns of v_active_showtimes_details kept per showtime
+ENTRY_FIELDS = ('showtime_id', 'movie_id', 'screen_id', 'start_time', 'end_time', 'screen_name',
+                'screen_format', 'cinema_id', 'cinema_name', 'cinema_address', 'cinema_city')
+
+
+class TimetableEntry:
+    """One active showtime with its screen and cinema details"""
+
+    __slots__ = ENTRY_FIELDS
+
+    def __init__(self, row):
+        for field in ENTRY_FIELDS:
+            setattr(self, field, getattr(row, field))
+
+    @property
+    def sort_key(self) -> Tuple[datetime, int]:
+        return self.start_time, self.showtime_id
+
+
+def _active_showtimes_query():
+    """Same rows and filter as v_active_showtimes_details, minus the end_time cut"""
+    return (
+        select(
+            Showtimes.showtime_id, Showtimes.movie_id, Showtimes.screen_id,
+            Showtimes.start_time, Showtimes.end_time,
+            Screens.name.label('screen_name'), Screens.screen_format,
+            Cinemas.cinema_id, Cinemas.name.label('cinema_name'),
+            Cinemas.address.label('cinema_address'), Cinemas.city.label('cinema_city')
+        )
+        .join(Movies, Movies.movie_id == Showtimes.movie_id)
+        .join(Screens, Screens.screen_id == Showtimes.screen_id)
+        .join(Cinemas, Cinemas.cinema_id == Screens.cinema_id)
+        .where(Movies.status == 'open')
+    )
+
+
+class Timetable:
+    """Active showtimes by movie and by cinema day, aged out by end_time"""
+
+    def __init__(self):
+        self._db = None
+        self._entries: Dict[int, TimetableEntry] = {}
+        # movie_id -> [(start_time, showtime_id, entry)] in start order
+        self._by_movie: Dict[int, list] = {}
+        # (cinema_id, day) -> [(start_time, showtime_id, entry)] in start order
+        self._by_cinema_day: Dict[Tuple[int, date], list] = {}
+        # (end_time, showtime_id); entries removed meanwhile are skipped when popped
+        self._ending: List[Tuple[datetime, int]] = []
+        self._lock = threading.RLock()
+        self._loaded_at: Optional[float] = None
+        # Bumped by every incremental change so a racing reload is redone
+        self._generation = 0
+        self._loading = False
+        self.max_age = 600.0
+
+    def init_app(self, app, db):
+        self._db = db
+        self.max_age = float(app.config.get('TIMETABLE_MAX_AGE', 600))
+
+    def load(self, attempts: int = 3):
+        """(Re)load the whole snapshot from the database"""
+        for attempt in range(attempts):
+            with self._lock:
+                generation = self._generation
+            now = datetime.now()
+            with self._db.engine.connect() as conn:
+                rows = conn.execute(_active_showtimes_query().where(Showtimes.end_time > now)).all()
+            with self._lock:
+                if generation != self._generation and attempt < attempts - 1:
+                    continue
+                self._entries, self._by_movie, self._by_cinema_day, self._ending = {}, {}, {}, []
+                for row in rows:
+                    self._add(TimetableEntry(row))
+                self._loaded_at = time.monotonic()
+                return
+
+    def _ensure_current(self):
+        """Reload an outdated snapshot; other readers keep the old one meanwhile"""
+        with self._lock:
+            if self._loading:
+                return
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return
+            self._loading = True
+        try:
+            self.load()
+        finally:
+            with self._lock:
+                self._loading = False
+
+    # Called with self._lock held
+    def _add(self, entry: TimetableEntry):
+        self._remove(entry.showtime_id)
+        self._entries[entry.showtime_id] = entry
+        item = (entry.start_time, entry.showtime_id, entry)
+        bisect.insort(self._by_movie.setdefault(entry.movie_id, []), item)
+        bisect.insort(self._by_cinema_day.setdefault((entry.cinema_id, entry.start_time.date()), []), item)
+        heapq.heappush(self._ending, (entry.end_time, entry.showtime_id))
+
+    # Called with self._lock held
+    def _remove(self, showtime_id: int):
+        entry = self._entries.pop(showtime_id, None)
+        if entry is None:
+            return
+        for index, key in ((self._by_movie, entry.movie_id),
+                           (self._by_cinema_day, (entry.cinema_id, entry.start_time.date()))):
+            items = index[key]
+            position = bisect.bisect_left(items, entry.sort_key)
+            if position < len(items) and items[position][2] is entry:
+                del items[position]
+            if not items:
+                del index[key]
+
+    # Called with self._lock held
+    def _age_out(self, now: datetime):
+        """Drop every showtime that has ended, earliest end first"""
+        while self._ending and self._ending[0][0] <= now:
+            end_time, showtime_id = heapq.heappop(self._ending)
+            entry = self._entries.get(showtime_id)
+            if entry is not None and entry.end_time == end_time:
+                self._remove(showtime_id)
+
+    def _changed(self):
+        with self._lock:
+            self._generation += 1
+
+    def add_showtimes(self, showtime_ids: Iterable[int]):
+        """Add created (or moved) showtimes, read in one query"""
+        showtime_ids = list(showtime_ids)
+        if not showtime_ids:
+            return
+        self._changed()
+        with self._db.engine.connect() as conn:
+            rows = conn.execute(_active_showtimes_query().where(Showtimes.showtime_id.in_(showtime_ids))).all()
+        now = datetime.now()
+        with self._lock:
+            for showtime_id in showtime_ids:
+                self._remove(showtime_id)
+            for row in rows:
+                if row.end_time > now:
+                    self._add(TimetableEntry(row))
+
+    def remove_showtime(self, showtime_id: int):
+        """Drop a deleted showtime"""
+        self._changed()
+        with self._lock:
+            self._remove(showtime_id)
+
+    def reload_movie(self, movie_id: int):
+        """Re-read one movie's showtimes, e.g. after it was opened or closed"""
+        self._changed()
+        now = datetime.now()
+        with self._db.engine.connect() as conn:
+            rows = conn.execute(
+                _active_showtimes_query().where(Showtimes.movie_id == movie_id, Showtimes.end_time > now)
+            ).all()
+        with self._lock:
+            for _, showtime_id, _ in list(self._by_movie.get(movie_id, ())):
+                self._remove(showtime_id)
+            for row in rows:
+                self._add(TimetableEntry(row))
+
+    def remove_movie(self, movie_id: int):
+        """Drop every showtime of a deleted movie"""
+        self._changed()
+        with self._lock:
+            for _, showtime_id, _ in list(self._by_movie.get(movie_id, ())):
+                self._remove(showtime_id)
+
+    def for_movie(self, movie_id: int) -> List[TimetableEntry]:
+        """Active showtimes of a movie in start_time order"""
+        self._ensure_current()
+        with self._lock:
+            self._age_out(datetime.now())
+            return [entry for _, _, entry in self._by_movie.get(movie_id, ())]
+
+    def for_cinema_day(self, cinema_id: int, day: date) -> List[TimetableEntry]:
+        """Active showtimes starting at a cinema on a day, in start_time order"""
+        self._ensure_current()
+        with self._lock:
+            self._age_out(datetime.now())
+            return [entry for _, _, entry in self._by_cinema_day.get((cinema_id, day), ())]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+timetable = Timetable()